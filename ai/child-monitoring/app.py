@@ -14,9 +14,19 @@ from dotenv import load_dotenv
 
 # Import your existing RAG system
 from rag import ChildMonitoringRAG
+from logger import configure_logging, get_logger, sampled, RequestIdMiddleware
+from metrics import configure_metrics, stage, render as render_metrics
+from fastapi import Response
 
 load_dotenv()
 
+configure_logging("child-monitoring", os.getenv("LOG_LEVEL", "INFO"))
+configure_metrics("child-monitoring")
+logger = get_logger(__name__)
+
+# share of streamed tokens that are logged, a log line per token would cost more than the token
+TOKEN_LOG_SAMPLE_RATE = float(os.getenv("LOG_TOKEN_SAMPLE_RATE", "0.01"))
+
 # Global variable to store the RAG system
 rag_system = None
 
@@ -26,7 +36,7 @@ async def lifespan(app: FastAPI):
     global rag_system
     
     # Initialize RAG system
-    print("Initializing RAG system...")
+    logger.info("Initializing RAG system...")
     rag_system = ChildMonitoringRAG(
         data_dir="knowledge_base/",
         similarity_threshold=0.25,
@@ -35,12 +45,12 @@ async def lifespan(app: FastAPI):
     
     # Initialize the RAG system (this will create/load vector database)
     rag_system.initialize_rag(rebuild=True)
-    print("RAG system initialized successfully!")
+    logger.info("RAG system initialized successfully!")
     
     yield
     
     # Cleanup on shutdown
-    print("Shutting down RAG system...")
+    logger.info("Shutting down RAG system...")
 
 app = FastAPI(
     title="Child Moral Monitoring Chatbot",
@@ -57,6 +67,7 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(RequestIdMiddleware)
 
 # Initialize the main LLM for final response generation
 chat_model = ChatOpenAI(
@@ -93,6 +104,11 @@ async def health_check():
         message="Child Monitoring Chatbot is running"
     )
 
+@app.get("/metrics")
+async def metrics():
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
+
 @app.get("/")
 async def root():
     """Root endpoint with basic info"""
@@ -112,17 +128,21 @@ async def generate_streaming_response(prompt_value) -> AsyncGenerator[str, None]
     """
     try:
         # Stream the response from the LLM
-        async for chunk in chat_model.astream(prompt_value.to_messages()):
-            if chunk.content:                
-                # Format as Server-Sent Events
-                data = {
-                    "content": chunk.content,
-                    "type": "content"
-                }
-                yield f"data: {json.dumps(data)}\n\n"
-                
-                # Add small delay to make streaming more visible
-                await asyncio.sleep(0.01)
+        with stage("llm_stream", provider="sea-lion"):
+            async for chunk in chat_model.astream(prompt_value.to_messages()):
+                if chunk.content:
+                    if sampled(TOKEN_LOG_SAMPLE_RATE):
+                        logger.debug("streamed token", extra={"fields": {"chars": len(chunk.content)}})
+
+                    # Format as Server-Sent Events
+                    data = {
+                        "content": chunk.content,
+                        "type": "content"
+                    }
+                    yield f"data: {json.dumps(data)}\n\n"
+                    
+                    # Add small delay to make streaming more visible
+                    await asyncio.sleep(0.01)
         
         # Send completion signal
         completion_data = {
@@ -132,6 +152,7 @@ async def generate_streaming_response(prompt_value) -> AsyncGenerator[str, None]
         yield f"data: {json.dumps(completion_data)}\n\n"
         
     except Exception as e:
+        logger.exception("Error generating streaming response")
         # Send error signal
         error_data = {
             "content": f"Error generating response: {str(e)}",
@@ -151,12 +172,13 @@ async def chat_stream(request: ChatRequest):
     
     try:
         # Create the prompt using your RAG system
-        prompt_value = rag_system.create_prompt(
-            token=request.token,
-            query=request.message,
-            child_age=request.child_age,
-            lang_code=request.lang_code  # Use lang_code for language-specific responses
-        )
+        with stage("prompt_building"):
+            prompt_value = rag_system.create_prompt(
+                token=request.token,
+                query=request.message,
+                child_age=request.child_age,
+                lang_code=request.lang_code  # Use lang_code for language-specific responses
+            )
         
         # Return streaming response
         return StreamingResponse(
@@ -170,7 +192,7 @@ async def chat_stream(request: ChatRequest):
         )
         
     except Exception as e:
-        print(f"Error in chat_stream: {str(e)}")
+        logger.exception("Error in chat_stream")
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
 @app.post("/chat", response_model=ChatResponse)
@@ -185,26 +207,28 @@ async def chat(request: ChatRequest):
     
     try:
         # Generate the prompt using your RAG system
-        print(f"Processing query: {request.message}")
-        print(f"Child age: {request.child_age}")
+        # the message itself is the parent's text, only its size is logged
+        logger.info("Processing query", extra={"fields": {"message_chars": len(request.message), "child_age": request.child_age}})
         
         # Create the prompt using your RAG system
-        prompt_value = rag_system.create_prompt(
-            query=request.message,
-            child_age=request.child_age,
-            token=request.token,  # Optional token for internal use
-            lang_code=request.lang_code  # Use lang_code for language-specific responses
-        )
+        with stage("prompt_building"):
+            prompt_value = rag_system.create_prompt(
+                query=request.message,
+                child_age=request.child_age,
+                token=request.token,  # Optional token for internal use
+                lang_code=request.lang_code  # Use lang_code for language-specific responses
+            )
         
         # Get response from LLM (non-streaming)
-        response = await chat_model.ainvoke(prompt_value.to_messages())
+        async with stage("llm", provider="sea-lion"):
+            response = await chat_model.ainvoke(prompt_value.to_messages())
         
         return ChatResponse(
             response=response.content, # type: ignore
         )
         
     except Exception as e:
-        print(f"Error in chat: {str(e)}")
+        logger.exception("Error in chat")
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
 @app.get("/system/status")
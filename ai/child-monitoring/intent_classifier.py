@@ -6,9 +6,13 @@ from dotenv import load_dotenv
 from pydantic import SecretStr
 from typing import Dict, List, Any
 from chatbot_instructions import PROMPT_TEMPLATE_INTENT_CLASSIFIER
+from logger import get_logger
+from metrics import stage
 
 load_dotenv()
 
+logger = get_logger(__name__)
+
 
 class IntentClassifier:
     """
@@ -40,6 +44,7 @@ class IntentClassifier:
             """
         ]
 
+    @stage("intent_classification")
     def classify(self, query: str) -> Dict[str, Any]:
         """
         Classifies the user's query and extracts parameters using the LLM.
@@ -55,7 +60,7 @@ class IntentClassifier:
             query=query, themes_list=", ".join(self.themes_list)
         )
         # Attempt to invoke the LLM with the formatted prompt
-        print("Classifying user query...")
+        logger.debug("Classifying user query...")
         try:
             response = self.llm.invoke(formatted_prompt)
             # Add a check for empty or invalid response content
@@ -63,11 +68,10 @@ class IntentClassifier:
             if not content.strip():
                 raise ValueError("LLM returned an empty response.")
             intent_data = json.loads(content.strip())  # type: ignore
-            # Print for debugging
-            print(f"Intent classification result: {intent_data}")
+            logger.debug("Intent classification result", extra={"fields": {"intent": intent_data.get("intent")}})
             return intent_data
         except (json.JSONDecodeError, ValueError) as e:
-            print(
+            logger.warning(
                 f"An error occurred during JSON parsing or with the LLM response: {e}"
             )
             return {
@@ -83,8 +87,8 @@ class IntentClassifier:
                     }
                 ],
             }
-        except Exception as e:
-            print(f"An unexpected error occurred during intent classification: {e}")
+        except Exception:
+            logger.exception("An unexpected error occurred during intent classification")
             return {
                 "intent": "general_query",
                 "api_call_details": [
@@ -0,0 +1,100 @@
+import asyncio
+import functools
+import time
+from prometheus_client import Counter, Gauge, Histogram, CONTENT_TYPE_LATEST, generate_latest
+
+'''
+prometheus metrics shared by the backend and the ai services (every service builds its
+own docker image, so each one keeps a copy of this file, keep them the same).
+
+    with stage("tts", provider="azure"):          # or: async with stage(...)
+        ...
+
+    @stage("retrieval")
+    def retrieve(...): ...
+
+records the duration per stage, provider and outcome (success, error or cancelled), and the
+number of runs of every stage that are in flight. count() adds to the event counters
+(retries, cache hits, ...).
+'''
+
+SUCCESS = "success"
+ERROR = "error"
+CANCELLED = "cancelled"
+
+_service = "unknown"
+
+STAGE_DURATION = Histogram(
+    "stage_duration_seconds",
+    "Duration of a stage of the request / job",
+    ["service", "stage", "provider", "outcome"],
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 40, 60, 120, 300),
+)
+STAGE_IN_FLIGHT = Gauge(
+    "stage_in_flight",
+    "Runs of a stage that are not finished yet",
+    ["service", "stage"],
+)
+EVENTS = Counter(
+    "events_total",
+    "Things worth counting that are not a stage, e.g. retries and cache hits",
+    ["service", "event", "kind"],
+)
+
+def configure_metrics(service: str):
+    global _service
+    _service = service
+
+def count(event: str, kind: str = "", amount: float = 1):
+    EVENTS.labels(_service, event, kind).inc(amount)
+
+class stage:
+    def __init__(self, name: str, provider: str = ""):
+        self.name = name
+        self.provider = provider
+        self._started_at = None
+
+    def __enter__(self):
+        STAGE_IN_FLIGHT.labels(_service, self.name).inc()
+        self._started_at = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        duration = time.perf_counter() - self._started_at
+        if exc_type is None:
+            outcome = SUCCESS
+        elif issubclass(exc_type, (asyncio.CancelledError, GeneratorExit)):
+            # e.g. the losing side of a hedged request, or a client leaving a stream
+            outcome = CANCELLED
+        else:
+            outcome = ERROR
+        STAGE_DURATION.labels(_service, self.name, self.provider, outcome).observe(duration)
+        STAGE_IN_FLIGHT.labels(_service, self.name).dec()
+        return False
+
+    async def __aenter__(self):
+        return self.__enter__()
+
+    async def __aexit__(self, exc_type, exc, traceback):
+        return self.__exit__(exc_type, exc, traceback)
+
+    def __call__(self, function):
+        # a new instance per call, the start time must not be shared between concurrent runs
+        if asyncio.iscoroutinefunction(function):
+            @functools.wraps(function)
+            async def async_wrapper(*args, **kwargs):
+                with stage(self.name, self.provider):
+                    return await function(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with stage(self.name, self.provider):
+                return function(*args, **kwargs)
+        return wrapper
+
+def render() -> tuple:
+    '''
+    returns (body, content type) of the prometheus text format
+    '''
+    return generate_latest(), CONTENT_TYPE_LATEST
@@ -16,9 +16,13 @@ from langchain_core.prompt_values import PromptValue
 from dotenv import load_dotenv
 from chatbot_instructions import build_output_format_template, PROMPT_TEMPLATE_CHATBOT
 from langcodes import Language
+from logger import get_logger, request_id_var, REQUEST_ID_HEADER
+from metrics import stage
 
 load_dotenv()
 
+logger = get_logger(__name__)
+
 
 class ChildMonitoringRAG:
     def __init__(
@@ -63,7 +67,7 @@ class ChildMonitoringRAG:
                 loader = PyPDFLoader(file_path)
                 loaded_docs = loader.load()
                 documents.extend(loaded_docs)
-                print(f"Loaded {len(loaded_docs)} documents from {file_path}")
+                logger.info(f"Loaded {len(loaded_docs)} documents from {file_path}")
         return documents
 
     def _setup_vector_store(self, chunk_size: int = 1000):
@@ -72,9 +76,9 @@ class ChildMonitoringRAG:
         """
         if os.path.exists(self.persist_directory):
             shutil.rmtree(self.persist_directory)
-        print("Loading documents for new vector store...")
+        logger.info("Loading documents for new vector store...")
         documents = self._load_documents()
-        print("Setting up new vector database...")
+        logger.info("Setting up new vector database...")
 
         text_splitter = RecursiveCharacterTextSplitter(
             chunk_size=chunk_size,
@@ -84,14 +88,14 @@ class ChildMonitoringRAG:
         )
 
         splits = text_splitter.split_documents(documents)
-        print(f"Split documents into {len(splits)} chunks.")
+        logger.info(f"Split documents into {len(splits)} chunks.")
 
         self.vectorstore = Chroma.from_documents(
             documents=splits,
             embedding=self.embeddings,
             persist_directory=self.persist_directory,  # Use self.persist_directory
         )
-        print(
+        logger.info(
             f"Vector store created at {self.persist_directory} with {len(splits)} chunks."
         )
 
@@ -142,15 +146,18 @@ class ChildMonitoringRAG:
                 url += f"?{params_str}"
                 url = url[:-1]
 
-            print(f"Trying to call URL: {url}")
+            logger.debug(f"Trying to call URL: {url}")
             header = {
                 "Authorization": f"Bearer {token}" if token else "",
+                # lets the backend logs of this call be joined to the chat request
+                REQUEST_ID_HEADER: request_id_var.get() or "",
             }
             # Call the backend
-            response = requests.get(
-                url=url,
-                headers=header,
-            )
+            with stage("backend_api_call", provider=api_type or ""):
+                response = requests.get(
+                    url=url,
+                    headers=header,
+                )
             results[api_type] = response.content.decode("utf-8")
 
         return results
@@ -165,21 +172,22 @@ class ChildMonitoringRAG:
         """
 
         if lang_code != "en":
-            print(
+            logger.debug(
                 f"Translating query from {Language.get(lang_code).display_name()} to English..."
             )
-            response = requests.post(
-                "http://localhost:8003/translate",
-                json={
-                    "q": query,
-                    "source": lang_code,
-                    "target": "en",
-                    "format": "text",
-                    "alternatives": 3,
-                    "api_key": "",
-                },
-                headers={"Content-Type": "application/json"},
-            )
+            with stage("translation", provider="libretranslate"):
+                response = requests.post(
+                    "http://localhost:8003/translate",
+                    json={
+                        "q": query,
+                        "source": lang_code,
+                        "target": "en",
+                        "format": "text",
+                        "alternatives": 3,
+                        "api_key": "",
+                    },
+                    headers={"Content-Type": "application/json"},
+                )
 
             translation_result = response.json()
             query = translation_result.get("translatedText", query)
@@ -194,7 +202,7 @@ class ChildMonitoringRAG:
             response = self._make_backend_api_call(api_details.get("api_call_details", []), token)
             return response
         except Exception as e:
-            print(f"An error occurred while fetching children's data: {e}")
+            logger.warning(f"An error occurred while fetching children's data: {e}")
             return {}
 
     def _get_rag_context(self, query: str, lang_code) -> str:
@@ -204,37 +212,39 @@ class ChildMonitoringRAG:
         Returns a string containing the RAG context.
         """
         if not self.retriever:
-            print("Retriever not initialized. Ensure initialize_rag() was called.")
+            logger.warning("Retriever not initialized. Ensure initialize_rag() was called.")
             return ""
 
         try:
             if lang_code != "id":
-                print(
+                logger.debug(
                     f"Translating query from {Language.get(lang_code).display_name()} to Indonesian..."
                 )
-                response = requests.post(
-                    "http://localhost:8003/translate",
-                    json={
-                        "q": query,
-                        "source": lang_code,
-                        "target": "id",
-                        "format": "text",
-                        "alternatives": 3,
-                        "api_key": "",
-                    },
-                    headers={"Content-Type": "application/json"},
-                )
+                with stage("translation", provider="libretranslate"):
+                    response = requests.post(
+                        "http://localhost:8003/translate",
+                        json={
+                            "q": query,
+                            "source": lang_code,
+                            "target": "id",
+                            "format": "text",
+                            "alternatives": 3,
+                            "api_key": "",
+                        },
+                        headers={"Content-Type": "application/json"},
+                    )
 
                 translation_result = response.json()
                 query = translation_result.get("translatedText", query)
 
-            rag_context_docs = self.retriever.invoke(query)
+            with stage("retrieval", provider="chroma"):
+                rag_context_docs = self.retriever.invoke(query)
             rag_context_text = "\n\n".join(
                 [doc.page_content for doc in rag_context_docs]
             )
             return rag_context_text.strip()
         except Exception as e:
-            print(f"Error retrieving RAG documents: {e}")
+            logger.warning(f"Error retrieving RAG documents: {e}")
             return ""
 
     def initialize_rag(self, rebuild: bool = False):
@@ -244,19 +254,19 @@ class ChildMonitoringRAG:
             rebuild (bool): If True, forces a rebuild of the vector store
                             even if it already exists.
         """
-        print("Initializing RAG system...")
+        logger.info("Initializing RAG system...")
 
         if os.path.exists(self.persist_directory) and not rebuild:
-            print("Using existing vector store from:", self.persist_directory)
+            logger.info(f"Using existing vector store from: {self.persist_directory}")
             self.vectorstore = Chroma(
                 persist_directory=self.persist_directory,
                 embedding_function=self.embeddings,
             )
             if self.vectorstore._collection.count() == 0:
-                print("Existing vector store is empty, rebuilding...")
+                logger.info("Existing vector store is empty, rebuilding...")
                 self._setup_vector_store()
         else:
-            print("Creating new vector store...")
+            logger.info("Creating new vector store...")
             self._setup_vector_store()
 
         if self.vectorstore is not None:
@@ -268,13 +278,13 @@ class ChildMonitoringRAG:
                 },
             )
         else:
-            print("Error: Vector store is not initialized.")
+            logger.warning("Error: Vector store is not initialized.")
             return
 
-        print(
+        logger.info(
             f"Retriever initialized with top_k={self.top_k} and similarity threshold={self.similarity_threshold}."
         )
-        print("RAG system initialized successfully.")
+        logger.info("RAG system initialized successfully.")
 
     def create_prompt(
         self, query: str, child_age: int, lang_code: str, token: str
@@ -283,20 +293,20 @@ class ChildMonitoringRAG:
         Creates a formatted prompt for the LLM, combining children's data context and RAG context.
         """
         # DEBUG lang_code
-        print(f"Creating prompt for query: {query} with child age: {child_age} and language code: {lang_code}")
+        logger.debug("Creating prompt", extra={"fields": {"query_chars": len(query), "child_age": child_age, "lang_code": lang_code}})
         
         # Get children's data context
-        print("Retrieving children's data context...")
+        logger.debug("Retrieving children's data context...")
         children_data_context = self._get_children_data_context(query, token, lang_code)
         if not children_data_context:
-            print("No children's data context found for the query.")
+            logger.debug("No children's data context found for the query.")
             children_data_context = "No children's data context found for the query."
 
         # Get RAG context documents
-        print("Retrieving RAG context documents...")
+        logger.debug("Retrieving RAG context documents...")
         rag_context_text = self._get_rag_context(query, lang_code)
         if not rag_context_text:
-            print("No RAG context found for the query.")
+            logger.debug("No RAG context found for the query.")
             rag_context_text = "No RAG context found for the query."
 
         output_format = build_output_format_template()
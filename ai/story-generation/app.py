@@ -10,10 +10,17 @@ from rag import IndonesianStoryRAG
 from langchain_openai import ChatOpenAI
 from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
+from logger import configure_logging, get_logger, RequestIdMiddleware
+from metrics import configure_metrics, stage, render as render_metrics
+from fastapi import Response
 import os
 
 load_dotenv()
 
+configure_logging("story-generation", os.getenv("LOG_LEVEL", "INFO"))
+configure_metrics("story-generation")
+logger = get_logger(__name__)
+
 # Request models
 class StoryRequest(BaseModel):
     query: str = Field(description="Story request in Indonesian", examples=["Cerita tentang menabung"])
@@ -84,6 +91,7 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(RequestIdMiddleware)
 
 # Initialize your RAG system
 rag = IndonesianStoryRAG(
@@ -299,26 +307,30 @@ def validate_story_content(story_data: dict, user_id: str, age: int):
 async def generate_story(request: StoryRequest):
     try:
         # Create prompt using your RAG system - convert age to range for RAG
-        prompt = rag.create_prompt(
-            query=request.query,
-            user_id=request.user_id,
-            age=request.age,
-            lang_code=request.lang_code
-        )
+        with stage("prompt_building"):
+            prompt = rag.create_prompt(
+                query=request.query,
+                user_id=request.user_id,
+                age=request.age,
+                lang_code=request.lang_code
+            )
         
         # Get response from LLM
-        print(f"Generating story for user {request.user_id} with age {request.age}...")
-        response = chat_model.invoke(prompt)
+        logger.info("Generating story", extra={"fields": {"user_id": request.user_id, "age": request.age}})
+        with stage("llm", provider="sea-lion"):
+            response = chat_model.invoke(prompt)
         # Clean and parse JSON
         if response:
             content = str(response.content)
-            story_json = clean_json_response(content)
+            with stage("json_parsing"):
+                story_json = clean_json_response(content)
         
-        print('Validating story content...')
+        logger.debug('Validating story content...')
         # Validate and standardize the story content
-        story_json = validate_story_content(story_json, request.user_id, request.age)
+        with stage("validation"):
+            story_json = validate_story_content(story_json, request.user_id, request.age)
         
-        print(f"Generated story for user {request.user_id} with age {request.age}: {story_json['title']}")
+        logger.info("Generated story", extra={"fields": {"user_id": request.user_id, "age": request.age, "scenes": len(story_json.get("scene", []))}})
         return StoryResponse(**story_json)
         
     except Exception as e:
@@ -337,6 +349,11 @@ def clean_json_response(content: str) -> dict:
     except json.JSONDecodeError as e:
         raise HTTPException(status_code=500, detail=f"Invalid JSON response from AI: {str(e)}")
 
+@app.get("/metrics")
+async def metrics():
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
+
 # Health check endpoint
 @app.get("/")
 async def root():
@@ -0,0 +1,136 @@
+import atexit
+import contextvars
+import copy
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+import time
+import uuid
+
+'''
+structured logging shared by the backend and the ai services (every service builds its
+own docker image, so each one keeps a copy of this file, keep them the same).
+
+records are written as one json object per line. the request handlers only put the
+record on a queue, a background thread formats and writes it, so a slow stdout never
+blocks the event loop. every record carries the id of the request it belongs to.
+'''
+
+REQUEST_ID_HEADER = "x-request-id"
+
+request_id_var = contextvars.ContextVar("request_id", default=None)
+
+_listener = None
+
+class JsonFormatter(logging.Formatter):
+    def __init__(self, service: str):
+        super().__init__()
+        self.service = service
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname.lower(),
+            "service": self.service,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        request_id = getattr(record, "request_id", None)
+        if request_id:
+            entry["request_id"] = request_id
+        fields = getattr(record, "fields", None)
+        if fields:
+            entry.update(fields)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+class _RequestIdQueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        # the context var is only readable on the calling side, copy it before the hand over
+        record.request_id = request_id_var.get()
+        # resolve the arguments here, they may change before the writer thread gets to them
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+def configure_logging(service: str, level: str = "INFO"):
+    '''
+    routes every logger through a queue to a json stdout writer thread, call once at startup
+    '''
+    global _listener
+    if _listener is not None:
+        return
+
+    log_queue = queue.SimpleQueue()
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(JsonFormatter(service))
+
+    root = logging.getLogger()
+    root.handlers = [_RequestIdQueueHandler(log_queue)]
+    root.setLevel(level.upper())
+
+    _listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+def shutdown_logging():
+    # flushes what is still on the queue
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+def get_logger(name: str) -> logging.Logger:
+    return logging.getLogger(name)
+
+def sampled(rate: float) -> bool:
+    '''
+    true for about rate of the calls, for events that happen per token or per chunk
+    '''
+    return rate >= 1 or (rate > 0 and random.random() < rate)
+
+class RequestIdMiddleware:
+    '''
+    takes the request id from the x-request-id header (or makes one), keeps it in the
+    context for the logs and sends it back, so one request can be followed across services
+    '''
+    def __init__(self, app):
+        self.app = app
+        self.logger = get_logger("http")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        headers = dict(scope.get("headers") or [])
+        request_id = headers.get(REQUEST_ID_HEADER.encode(), b"").decode() or uuid.uuid4().hex
+        token = request_id_var.set(request_id)
+        started_at = time.perf_counter()
+        status_code = 500
+
+        async def send_with_request_id(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [(REQUEST_ID_HEADER.encode(), request_id.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_request_id)
+        finally:
+            self.logger.info("request", extra={"fields": {
+                "method": scope.get("method"),
+                "path": scope.get("path"),
+                "status": status_code,
+                "duration_ms": round((time.perf_counter() - started_at) * 1000, 1),
+            }})
+            request_id_var.reset(token)
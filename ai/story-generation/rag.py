@@ -10,9 +10,13 @@ from dotenv import load_dotenv
 from story_instructions import StoryInstructions, PROMPT_TEMPLATE
 from langcodes import Language
 import requests
+from logger import get_logger
+from metrics import stage
 
 load_dotenv()
 
+logger = get_logger(__name__)
+
 
 class IndonesianStoryRAG:
     def __init__(
@@ -46,33 +50,33 @@ class IndonesianStoryRAG:
 
     def load_documents(self):
         if not os.path.exists(self.data_dir):
-            print(f"Warning: Data directory {self.data_dir} does not exist!")
+            logger.warning(f"Data directory {self.data_dir} does not exist!")
             return []
         loader = DirectoryLoader(self.data_dir, glob="**/*.md")
         documents = loader.load()
-        print(f"Loaded {len(documents)} documents from {self.data_dir}")
+        logger.info(f"Loaded {len(documents)} documents from {self.data_dir}")
         return documents
 
     def initialize_rag(self, rebuild: bool = False):
-        print("Initializing RAG system...")
-        print(f"Data directory: {self.data_dir}")
+        logger.info("Initializing RAG system...")
+        logger.info(f"Data directory: {self.data_dir}")
 
         if os.path.exists(self.persist_directory) and not rebuild:
             self.vector_store = Chroma(
                 persist_directory=self.persist_directory,
                 embedding_function=self.embeddings,
             )
-            print("Using existing vector store from:", self.persist_directory)
+            logger.info(f"Using existing vector store from: {self.persist_directory}")
         else:
             if os.path.exists(self.persist_directory):
-                print(f"Deleting existing vector store at {self.persist_directory}...")
+                logger.info(f"Deleting existing vector store at {self.persist_directory}...")
                 shutil.rmtree(self.persist_directory)
             documents = self.load_documents()
             if not documents:
-                print("No documents found to build vector store. RAG not initialized.")
+                logger.warning("No documents found to build vector store. RAG not initialized.")
                 return False
             self.setup_vector_store(documents)
-            print("RAG system initialized successfully!")
+            logger.info("RAG system initialized successfully!")
 
         self.retriever = self.vector_store.as_retriever(
             search_type="similarity_score_threshold",
@@ -88,32 +92,36 @@ class IndonesianStoryRAG:
             raise ValueError("Retriever not initialized. Call initialize_rag() first.")
         try:
             if lang_code != "id":
-                print(
+                logger.debug(
                     f"Translating query from {Language.get(lang_code).display_name()} to Indonesian..."
                 )
-                response = requests.post(
-                    "http://localhost:8003/translate",
-                    json={
-                        "q": query,
-                        "source": lang_code,
-                        "target": "id",
-                        "format": "text",
-                        "alternatives": 3,
-                        "api_key": "",
-                    },
-                    headers={"Content-Type": "application/json"},
-                )
-
-                translation_result = response.json()
+                with stage("translation", provider="libretranslate"):
+                    response = requests.post(
+                        "http://localhost:8003/translate",
+                        json={
+                            "q": query,
+                            "source": lang_code,
+                            "target": "id",
+                            "format": "text",
+                            "alternatives": 3,
+                            "api_key": "",
+                        },
+                        headers={"Content-Type": "application/json"},
+                    )
+
+                    translation_result = response.json()
                 query = translation_result.get("translatedText", query)
 
-            context_docs = self.retriever.invoke(query)
-            print(
-                f"Retrieved {len(context_docs)} relevant documents for query: {query}"
+            with stage("retrieval", provider="chroma"):
+                context_docs = self.retriever.invoke(query)
+            # the query is the user's own text, only its size is logged
+            logger.debug(
+                "Retrieved relevant documents",
+                extra={"fields": {"documents": len(context_docs), "query_chars": len(query)}}
             )
             return context_docs
         except Exception as e:
-            print(f"Error retrieving context: {e}")
+            logger.warning(f"Error retrieving context: {e}")
             return []
 
     def create_prompt(self, lang_code, query, user_id, age: int):
@@ -0,0 +1,76 @@
+'''
+serialization time of a full book response, jsonable_encoder + json (the old
+default JSONResponse) against utils.json_response (orjson), using the story of
+handler/scene_sample.json
+
+usage, from the backend directory:
+    python -m benchmarks.json_serialization --rounds 2000
+'''
+import argparse
+import json
+import statistics
+import time
+from datetime import datetime
+from beanie import PydanticObjectId
+from fastapi.encoders import jsonable_encoder
+from models.book import Book, BookStatus
+from utils import json_response
+
+def _load_book() -> Book:
+    with open("./handler/scene_sample.json", "r", encoding="utf-8") as f:
+        story = json.load(f)
+
+    # model_construct, a Book can not be initialised without a database behind it
+    now = datetime.utcnow()
+    return Book.model_construct(**{
+        **story,
+        "id": PydanticObjectId(),
+        "status": BookStatus.in_progress,
+        "created_at": now,
+        "finished_at": now
+    })
+
+def _default_response(content) -> bytes:
+    # what fastapi did for every handler that returned a dict
+    return json.dumps(
+        jsonable_encoder(content),
+        ensure_ascii=False,
+        allow_nan=False,
+        indent=None,
+        separators=(",", ":")
+    ).encode("utf-8")
+
+def _measure(serialize, content, rounds: int) -> list:
+    durations = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        serialize(content)
+        durations.append(time.perf_counter() - start)
+    return durations
+
+def _report(label: str, durations: list):
+    durations = sorted(durations)
+    p99 = durations[min(int(len(durations) * 0.99), len(durations) - 1)]
+    print(
+        f"{label:<8} n={len(durations):<6} "
+        f"mean={statistics.mean(durations) * 1000:8.3f} ms  "
+        f"p50={statistics.median(durations) * 1000:8.3f} ms  "
+        f"p99={p99 * 1000:8.3f} ms"
+    )
+
+def main(rounds: int):
+    content = {"data": _load_book()}
+
+    before, after = _default_response(content), json_response.dumps(content)
+    # both have to give the same document, only the bytes may differ
+    assert json.loads(before) == json.loads(after), "orjson output differs from the default response"
+
+    print(f"book: {len(before)} bytes (json), {len(after)} bytes (orjson), rounds: {rounds}")
+    _report("json", _measure(_default_response, content, rounds))
+    _report("orjson", _measure(json_response.dumps, content, rounds))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="full book serialization, jsonable_encoder + json vs orjson")
+    parser.add_argument("--rounds", type=int, default=2000)
+    args = parser.parse_args()
+    main(args.rounds)
@@ -0,0 +1,70 @@
+'''
+per-scene TTS latency with a fresh client for every scene (the old behaviour)
+against the warm pooled clients, using the scenes of handler/scene_sample.json
+
+usage, from the backend directory with a filled .env:
+    python -m benchmarks.tts_latency --rounds 3
+'''
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from setting.settings import settings
+from utils.ai import azure_text_to_speech, google_text_to_speech
+
+DEFAULT_VOICES = {
+    "google": ("en-US-Chirp3-HD-Achernar", "en-US"),
+    "azure": ("en-US-JennyMultilingualNeural", "en-US"),
+}
+
+def _load_scenes() -> list:
+    with open("./handler/scene_sample.json", "r", encoding="utf-8") as f:
+        return [scene.get("content") for scene in json.load(f).get("scene")]
+
+async def _measure(provider, scenes: list, voice_name_code: str, language_code: str, cold: bool) -> list:
+    latencies = []
+    for text_content in scenes:
+        if cold:
+            provider.close_pool()
+
+        start = time.perf_counter()
+        await provider.synthesize_speech(text_content, voice_name_code, language_code)
+        latencies.append(time.perf_counter() - start)
+
+    return latencies
+
+def _report(label: str, latencies: list):
+    latencies = sorted(latencies)
+    p95 = latencies[min(int(len(latencies) * 0.95), len(latencies) - 1)]
+    print(
+        f"{label:<8} n={len(latencies):<4} "
+        f"mean={statistics.mean(latencies) * 1000:8.1f} ms  "
+        f"p50={statistics.median(latencies) * 1000:8.1f} ms  "
+        f"p95={p95 * 1000:8.1f} ms"
+    )
+
+async def main(rounds: int):
+    provider_name = "google" if settings.CLOUD_PLATFORM_OPTION == "google" else "azure"
+    provider = google_text_to_speech if provider_name == "google" else azure_text_to_speech
+    voice_name_code, language_code = DEFAULT_VOICES[provider_name]
+    scenes = _load_scenes()
+
+    cold, pooled = [], []
+    for _ in range(rounds):
+        cold += await _measure(provider, scenes, voice_name_code, language_code, cold=True)
+
+        provider.warmup()
+        pooled += await _measure(provider, scenes, voice_name_code, language_code, cold=False)
+
+    provider.close_pool()
+
+    print(f"provider: {provider_name}, scenes per round: {len(scenes)}, rounds: {rounds}")
+    _report("cold", cold)
+    _report("pooled", pooled)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="per-scene TTS latency, fresh client vs pooled client")
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+    asyncio.run(main(args.rounds))
@@ -5,6 +5,10 @@ from datetime import datetime, timedelta, timezone
 from typing import Optional, List
 from utils.api_request import stream
 from setting.settings import settings
+from utils.logger import get_logger
+from utils.json_response import ORJSONResponse
+
+logger = get_logger(__name__)
 
 async def get_analytic(current_user):
     user_id = current_user.get("id")
@@ -21,7 +25,8 @@ async def get_analytic(current_user):
     weekly_timeline = child_analytic.get("weekly_timeline")
     overall_stats = child_analytic.get("overall_stats")
     
-    return {
+    # raw datetimes and all, orjson encodes them without the jsonable_encoder pass
+    return ORJSONResponse({
         "data": {
             "child_info": {
                 "user_id": user_id,
@@ -42,7 +47,7 @@ async def get_analytic(current_user):
             "weekly_timeline": weekly_timeline,
             "overall_stats": overall_stats
         }
-    }
+    })
 
 def _aggregate_child_analytic(books: list) -> dict:
     concept_performance = defaultdict(lambda: {
@@ -422,7 +427,7 @@ async def get_concept_performance(
     # Aggregate concept performance
     concept_performance = _aggregate_concept_performance(filtered_books, theme_list)
     
-    return {"concept_performance": concept_performance}
+    return ORJSONResponse({"concept_performance": concept_performance})
 
 # Performance timeline endpoint handler
 async def get_performance_timeline(
@@ -444,7 +449,7 @@ async def get_performance_timeline(
     # Aggregate performance timeline
     timeline = _aggregate_timeline(books_dict, time_unit, num_periods, start_date, end_date)
     
-    return {"performance_timeline": timeline}
+    return ORJSONResponse({"performance_timeline": timeline})
 
 # Overall statistics endpoint handler
 async def get_overall_statistic(current_user):
@@ -457,7 +462,7 @@ async def get_overall_statistic(current_user):
     books_dict = [book.dict() for book in books]
     
     child_analytic = _aggregate_child_analytic(books_dict)
-    return child_analytic["overall_stats"]
+    return ORJSONResponse(child_analytic["overall_stats"])
 
 ai_url = settings.CHILD_MONITORING_URL
 async def chat_stream(
@@ -474,7 +479,7 @@ async def chat_stream(
     }
     language_code = language_map.get(language, "id")
     # Debug language code
-    print(f"Using language code: {language_code}")
+    logger.debug(f"Using language code: {language_code}")
     request_body = {
         "message": message,
         "child_age": child_age,
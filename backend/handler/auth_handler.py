@@ -3,6 +3,7 @@ from fastapi import HTTPException
 from fastapi.responses import RedirectResponse
 from schema.request.auth_schema import login_schema,register_schema
 from models.user import User, AuthProvider
+from pymongo.errors import DuplicateKeyError
 from utils.hash import hash,compare
 from datetime import datetime
 from utils.jwt import create_access_token
@@ -26,7 +27,11 @@ async def register(body: register_schema):
         google_id = None
     )
     
-    await user.insert()
+    try:
+        await user.insert()
+    except DuplicateKeyError:
+        # registered by a concurrent request between the lookup and the insert
+        raise HTTPException(status_code= 409, detail= f"email {body.email} already register")
 
     return {
         "message": f"successfully create new user with id {str(user.id)}"
@@ -52,7 +57,7 @@ async def login(body: login_schema):
         "token": token
     }
 
-async def google_login(code):
+async def google_login(code, client: httpx.AsyncClient):
     data = {
         "code": code,
         "client_id": GOOGLE_CLIENT_ID,
@@ -61,8 +66,7 @@ async def google_login(code):
         "grant_type": "authorization_code",
     }
 
-    async with httpx.AsyncClient() as client:
-        token_resp = await client.post(GOOGLE_OAUTH2_URL, data=data)
+    token_resp = await client.post(GOOGLE_OAUTH2_URL, data=data)
 
     if token_resp.status_code != 200:
         raise HTTPException(status_code=400, detail=token_resp.text)
@@ -74,11 +78,10 @@ async def google_login(code):
     if not id_token:
         raise HTTPException(status_code=400, detail="No ID token returned by Google")
 
-    async with httpx.AsyncClient() as client:
-        userinfo_resp = await client.get(
-            "https://www.googleapis.com/oauth2/v3/userinfo",
-            headers={"Authorization": f"Bearer {access_token}"}
-        )
+    userinfo_resp = await client.get(
+        "https://www.googleapis.com/oauth2/v3/userinfo",
+        headers={"Authorization": f"Bearer {access_token}"}
+    )
 
     if userinfo_resp.status_code != 200:
         raise HTTPException(status_code=400, detail="Failed to fetch user info")
@@ -97,7 +100,16 @@ async def google_login(code):
             auth="google",
             google_id=google_id
         )
-        await user.insert()   # Beanie requires insert()
+        try:
+            await user.insert()   # Beanie requires insert()
+        except DuplicateKeyError:
+            # either a concurrent login of the same google account inserted it first,
+            # or the email already belongs to an account that registered with a password.
+            # such an account is not linked to the google id here, that owner logs in
+            # with the password
+            user = await User.find_one(User.google_id == google_id)
+            if not user:
+                raise HTTPException(status_code=409, detail=f"email {email} already register")
 
     jwt_token = create_access_token(user)
 
@@ -5,9 +5,25 @@ from setting.settings import settings
 from schema.request import book_schema
 from schema.response.book_card import Book_Card
 from collections import defaultdict
-from models.book import Book
 from utils.ai import AVAILABLE_VOICES
+from utils.background import run_in_background
+from fastapi.responses import StreamingResponse, Response
+from models.book import Book, BookStatus, BookCardView, BookOwnerView
+from beanie import UpdateResponse, PydanticObjectId
+from beanie.operators import And, Or
+from bson.errors import InvalidId
+from datetime import datetime, timedelta
+from utils import story_graph
+from utils import idempotency
+from utils import book_cache
+from utils import json_response
+import asyncio
+import base64
 import json
+from utils.logger import get_logger
+from utils.metrics import stage
+
+logger = get_logger(__name__)
 
 dummy_scene_json = None
 with open("./handler/scene_sample.json", "r", encoding="utf-8") as f:
@@ -15,6 +31,15 @@ with open("./handler/scene_sample.json", "r", encoding="utf-8") as f:
 
 book_stort_generation_url = settings.BOOK_STORY_GENERATION_URL
 
+PROGRESS_POLL_INTERVAL = 1  # sec
+# reading progress event ids kept per book, a retry older than that would be applied again
+PROGRESS_EVENT_HISTORY = 100
+# bookkeeping of the server, never part of a book the client gets
+BOOK_INTERNAL_FIELDS = {"applied_progress_events", "repair_attempts", "repair_lease_until", "version"}
+
+# (book id, scene id, media type) being generated by a prefetch, so a second prefetch skips them
+_in_flight_media = set()
+
 LANGUAGE_NORMALIZATION = {
     "en": "en-US",
     "id": "id-ID",
@@ -24,32 +49,137 @@ LANGUAGE_NORMALIZATION = {
     "ta": "ta-IN",
 }
 
-async def create_book(body: book_schema.create_book_schema, current_user):
-    query = body.query
-    age = body.age
+async def create_book(body: book_schema.create_book_schema, current_user, idempotency_key: str = None):
+    if not idempotency_key:
+        return await _create_book(body, current_user)
+
+    # a retried request attaches to the book that is already being generated
+    request_fingerprint = idempotency.fingerprint(user_id=current_user.get("id"), **body.model_dump())
+    return await idempotency.run_once(
+        current_user.get("id"),
+        idempotency_key,
+        request_fingerprint,
+        lambda: _create_book(body, current_user)
+    )
+
+async def _create_book(body: book_schema.create_book_schema, current_user):
     voice_name_code = body.voice_name_code
     language = body.language
-    country = body.country
+    user_id = current_user.get("id")
 
     _is_voice_name_code_invalid(language,voice_name_code)
 
     language_code = LANGUAGE_NORMALIZATION.get(language)
 
+    if body.is_async:
+        # persist a placeholder right away, the story and its media are filled in by the background job
+        new_book = Book(
+            user_id= user_id,
+            language= language,
+            age_group= body.age,
+            status= BookStatus.generating,
+            voice_name_code= voice_name_code,
+            language_code= language_code,
+            lazy_media= body.lazy_media
+        )
+        async with stage("mongo_insert"):
+            await new_book.insert()
+
+        run_in_background(_generate_book_in_background(new_book.id, body, user_id, language_code))
+
+        return {
+            "message": "book generation started",
+            "data":{
+                "id": str(new_book.id),
+                "status": new_book.status
+            }
+        }
+
+    book = await _generate_story(body, user_id)
+
+    # book = dummy_scene_json
+
+    requests = _build_media_requests(book, voice_name_code, language_code, _eager_scene_ids(body, book))
+    async with stage("media_generation"):
+        result = await generate_multiple_image_and_voice_concurrently(requests)
+
+    scene_data = defaultdict(list)
+    for item in result:
+        if item.get("error"):
+            continue
+        scene_data[item["scene_id"]].append(item)
+
+    for scene in book.get("scene"):
+        scene_id = scene.get("scene_id")
+
+        items = scene_data.get(scene_id, [])
+
+        cover_image = next((i for i in items if i["type"] == "cover_image"), None)
+        image = next((i for i in items if i["type"] == "image"), None)
+        voice = next((i for i in items if i["type"] == "voice"), None)
+        
+        if image and image.get("image"):
+            scene["img_url"] = image.get("image")
+            scene["img_thumb_url"] = image.get("image_thumb")
+
+        if voice and voice.get("voice"):
+            scene["voice_url"] = voice.get("voice")
+            scene["voice_duration"] = voice.get("voice_duration")
+            scene["voice_size"] = voice.get("voice_size")
+
+        if cover_image and cover_image.get("cover_image"):
+            book["cover_img_url"] = cover_image.get("cover_image")
+            book["cover_thumb_url"] = cover_image.get("cover_image_thumb")
+
+    new_book = Book(
+        **_story_fields(book),
+        status= book.get("status"),
+        pending_media= [_pending_media_item(item) for item in result if item.get("error")],
+        user_id= user_id,
+        voice_name_code= voice_name_code,
+        language_code= language_code,
+        lazy_media= body.lazy_media
+    )
+
+    async with stage("mongo_insert"):
+        await new_book.insert()
+
+    return {
+        "message": "successfully create new book",
+        "data":{
+            "id": str(new_book.id)
+        }
+    }
+
+@stage("story_generation")
+async def _generate_story(body: book_schema.create_book_schema, user_id: str) -> dict:
     # fetch to book_stort_generation_url
-    book = await post(
+    return await post(
         url= f"{book_stort_generation_url}/generate-story",
         body= {
-            "query": query,
-            "user_id": current_user.get("id"),
-            "age": age,
-            "lang_code": language,
-            "country_code": country,
+            "query": body.query,
+            "user_id": user_id,
+            "age": body.age,
+            "lang_code": body.language,
+            "country_code": body.country,
         }
     )
 
-    # book = dummy_scene_json
+def _eager_scene_ids(body: book_schema.create_book_schema, book: dict):
+    # in lazy mode only the scenes before the first choice are generated up front
+    if not body.lazy_media:
+        return None
+    return story_graph.scenes_until_decision(book.get("scene"))
 
+def _build_media_requests(book: dict, voice_name_code: str, language_code: str, scene_ids: list = None, include_cover: bool = True) -> list:
+    '''
+    scene_ids (optional) limits the requests to these scenes, in the given order
+    '''
     scenes = book.get("scene")
+    if scene_ids is not None:
+        scene_by_id = {scene.get("scene_id"): scene for scene in scenes}
+        scenes = [scene_by_id[scene_id] for scene_id in scene_ids if scene_id in scene_by_id]
+
     extracted_scenes = [
         {
             "scene_id": scene.get("scene_id"),
@@ -63,14 +193,15 @@ async def create_book(body: book_schema.create_book_schema, current_user):
     characters = book.get("characters")
 
     requests = []
-    requests.append({
-        "scene_id": None,
-        "type": "cover_image",
-        "prompt": _add_character_description(
-            characters=characters,
-            img_description=cover_img_description
-        )
-    })
+    if include_cover:
+        requests.append({
+            "scene_id": None,
+            "type": "cover_image",
+            "prompt": _add_character_description(
+                characters=characters,
+                img_description=cover_img_description
+            )
+        })
 
     for extracted_scene in extracted_scenes:
         img_description = extracted_scene.get("img_description")
@@ -91,58 +222,282 @@ async def create_book(body: book_schema.create_book_schema, current_user):
             "prompt": extracted_scene.get("content")
         })
 
-    result = await generate_multiple_image_and_voice_concurrently(requests)
+    return requests
 
-    scene_data = defaultdict(list)
-    for item in result:
-        scene_data[item["scene_id"]].append(item)
+def _story_fields(book: dict) -> dict:
+    return {
+        "title": book.get("title"),
+        "cover_img_url": book.get("cover_img_url"),
+        "cover_thumb_url": book.get("cover_thumb_url"),
+        "cover_img_description": book.get("cover_img_description") or "",
+        "description": book.get("description"),
+        "estimated_reading_time": book.get("estimated_reading_time"),
+        "theme": book.get("theme",None) or book.get("tema",None),
+        "age_group": book.get("age_group"),
+        "language": book.get("language"),
+        "current_scene": book.get("current_scene"),
+        "finished_at": book.get("finished_at"),
+        "maximum_point": book.get("maximum_point"),
+        "story_flow": book.get("story_flow"),
+        "characters": book.get("characters"),
+        "scene": book.get("scene"),
+        "user_story": book.get("user_story"),
+    }
 
-    for scene in book.get("scene"):
-        scene_id = scene.get("scene_id")
+@stage("book_generation")
+async def _generate_book_in_background(book_id, body: book_schema.create_book_schema, user_id: str, language_code: str):
+    try:
+        book = await _generate_story(body, user_id)
 
-        items = scene_data.get(scene_id, [])
+        await _update_book(book_id, {"$set": _story_fields(book)})
 
-        cover_image_url = next((i["cover_image"] for i in items if i["type"] == "cover_image"), None)
-        image_url = next((i["image"] for i in items if i["type"] == "image"), None)
-        voice_url = next((i["voice"] for i in items if i["type"] == "voice"), None)
-        
-        if image_url:
-            scene["img_url"] = image_url
+        scene_index = {scene.get("scene_id"): index for index, scene in enumerate(book.get("scene"))}
 
-        if voice_url:
-            scene["voice_url"] = voice_url
+        async def store_media_result(item: dict):
+            await _store_media_result(book_id, scene_index, item)
 
-        if cover_image_url:
-            book["cover_img_url"] = cover_image_url
+        requests = _build_media_requests(book, body.voice_name_code, language_code, _eager_scene_ids(body, book))
+        async with stage("media_generation"):
+            await generate_multiple_image_and_voice_concurrently(requests, on_complete=store_media_result)
 
-    new_book = Book(
-        title= book.get("title"),
-        cover_img_url= book.get("cover_img_url"),
-        description= book.get("description"),
-        estimated_reading_time= book.get("estimated_reading_time"),
-        theme= book.get("theme",None) or book.get("tema",None),
-        age_group= book.get("age_group"),
-        language= book.get("language"),
-        status= book.get("status"),
-        current_scene= book.get("current_scene"),
-        finished_at= book.get("finished_at"),
-        maximum_point= book.get("maximum_point"),
-        story_flow= book.get("story_flow"),
-        characters= book.get("characters"),
-        scene= book.get("scene"),
-        user_story= book.get("user_story"),
-        user_id= current_user.get("id")
-    )
+        await _update_book(book_id, {
+            "$set": {"status": book.get("status") or BookStatus.in_progress}
+        })
+    except Exception:
+        logger.exception("book generation failed", extra={"fields": {"book_id": str(book_id)}})
+        await _update_book(book_id, {"$set": {"status": BookStatus.failed}})
+
+def _pending_media_item(item: dict) -> dict:
+    return {"scene_id": item.get("scene_id"), "type": item.get("type")}
+
+@stage("mongo_update")
+async def _store_media_result(book_id, scene_index: dict, item: dict):
+    if item.get("error"):
+        # the book is kept, the repair job generates the missing media later
+        await _update_book(book_id, {"$addToSet": {"pending_media": _pending_media_item(item)}})
+        return
+
+    # $set on a single array element, so concurrent results never overwrite each other
+    item_type = item.get("type")
+    if item_type == "cover_image":
+        update = {
+            "cover_img_url": item.get("cover_image"),
+            "cover_thumb_url": item.get("cover_image_thumb")
+        }
+    elif item_type == "image":
+        prefix = f"scene.{scene_index[item.get('scene_id')]}"
+        update = {
+            f"{prefix}.img_url": item.get("image"),
+            f"{prefix}.img_thumb_url": item.get("image_thumb")
+        }
+    elif item_type == "voice":
+        prefix = f"scene.{scene_index[item.get('scene_id')]}"
+        update = {
+            f"{prefix}.voice_url": item.get("voice"),
+            f"{prefix}.voice_duration": item.get("voice_duration"),
+            f"{prefix}.voice_size": item.get("voice_size")
+        }
+    else:
+        return
+
+    await _update_book(book_id, {"$set": update})
 
-    await new_book.insert()
+def _versioned(update: dict) -> dict:
+    return {**update, "$inc": {**update.get("$inc", {}), "version": 1}}
+
+async def _update_book(book_id, update: dict, *conditions, response_type: UpdateResponse = UpdateResponse.UPDATE_RESULT):
+    '''
+    every write to an existing book goes through here (or through _versioned when the
+    book is found by something else than its id), it bumps the version the ETag is
+    built from and drops the cached body.
+    conditions (optional) narrow the match further, the update is skipped when they fail
+    '''
+    result = await Book.find_one(Book.id == book_id, *conditions).update(_versioned(update), response_type=response_type)
+    book_cache.invalidate(str(book_id))
+    return result
+
+async def prefetch_book_media(id: str, body: book_schema.prefetch_book_media_schema, current_user):
+    book = await _get_owned_book(id, current_user)
+    requests = _start_prefetch(book, body.scene_id)
 
     return {
-        "message": "successfully create new book",
+        "message": "book media prefetch started" if requests else "book media already available",
         "data":{
-            "id": str(new_book.id)
+            "id": str(book.id),
+            "scene_ids": list(dict.fromkeys(request.get("scene_id") for request in requests))
         }
     }
 
+def _start_prefetch(book: Book, scene_id: int) -> list:
+    # every branch ahead of the reader, unreached endings are never generated
+    scene_ids = story_graph.scenes_within(book.scene, scene_id, settings.MEDIA_PREFETCH_DEPTH)
+    requests = _missing_media_requests(book, scene_ids)
+
+    if requests:
+        # claimed before the task starts, so a prefetch right after this one already skips them
+        keys = {_in_flight_key(book.id, request) for request in requests}
+        _in_flight_media.update(keys)
+        run_in_background(_prefetch_in_background(book, requests, keys))
+
+    return requests
+
+def _missing_media_requests(book: Book, scene_ids: list) -> list:
+    scene_by_id = {scene.get("scene_id"): scene for scene in book.scene}
+    # failed items belong to the repair job, generating them here as well would race it
+    pending = {(item.get("scene_id"), item.get("type")) for item in book.pending_media}
+    requests = _build_media_requests(
+        {"scene": book.scene, "characters": book.characters},
+        book.voice_name_code,
+        book.language_code,
+        scene_ids,
+        include_cover=False
+    )
+
+    missing_requests = []
+    for request in requests:
+        scene = scene_by_id[request.get("scene_id")]
+        if request.get("type") == "image" and scene.get("img_url"):
+            continue
+        # books created before the voice was stored can not be narrated later
+        if request.get("type") == "voice" and (scene.get("voice_url") or not book.voice_name_code):
+            continue
+        if _in_flight_key(book.id, request) in _in_flight_media:
+            continue
+        if (request.get("scene_id"), request.get("type")) in pending:
+            continue
+        missing_requests.append(request)
+
+    return missing_requests
+
+def _in_flight_key(book_id, request: dict) -> tuple:
+    return (str(book_id), request.get("scene_id"), request.get("type"))
+
+async def _prefetch_in_background(book: Book, requests: list, keys: set):
+    scene_index = {scene.get("scene_id"): index for index, scene in enumerate(book.scene)}
+
+    async def store_media_result(item: dict):
+        # a failed item lands in pending_media, the repair job picks it up
+        await _store_media_result(book.id, scene_index, item)
+
+    try:
+        async with stage("media_generation"):
+            await generate_multiple_image_and_voice_concurrently(requests, on_complete=store_media_result)
+    except Exception:
+        logger.exception("book media prefetch failed", extra={"fields": {"book_id": str(book.id)}})
+    finally:
+        _in_flight_media.difference_update(keys)
+
+async def repair_pending_media():
+    '''
+    one run of the repair job: claims books with pending media one at a time and
+    generates what is missing. the claim is a lease, so a crashed run only delays the
+    book until the lease expires and several instances never work on the same book.
+    a book gets one attempt per run, the next one waits for the next run
+    '''
+    await _recover_stale_generations()
+
+    # the lease is released after every attempt, without this the loop would claim the
+    # same book again right away and spend all its attempts during one outage
+    processed = []
+    while True:
+        now = datetime.utcnow()
+        book = await Book.find_one(
+            {
+                "_id": {"$nin": processed},
+                "pending_media.0": {"$exists": True},
+                "status": {"$ne": BookStatus.generating},
+                "repair_attempts": {"$lt": settings.MEDIA_REPAIR_MAX_ATTEMPTS},
+                "$or": [{"repair_lease_until": None}, {"repair_lease_until": {"$lt": now}}]
+            }
+        ).update(
+            _versioned({
+                "$set": {"repair_lease_until": now + timedelta(seconds=settings.MEDIA_REPAIR_LEASE)},
+                "$inc": {"repair_attempts": 1}
+            }),
+            response_type=UpdateResponse.NEW_DOCUMENT
+        )
+        if not book:
+            return
+        book_cache.invalidate(str(book.id))
+        processed.append(book.id)
+
+        await _repair_book_media(book)
+
+async def _recover_stale_generations():
+    '''
+    a book still generating after BOOK_GENERATION_TIMEOUT lost its background job, e.g.
+    to a restart. without a story it failed, with one it is readable and the media it
+    is missing goes to the repair job
+    '''
+    deadline = datetime.utcnow() - timedelta(seconds=settings.BOOK_GENERATION_TIMEOUT)
+    stale_books = await Book.find(
+        Book.status == BookStatus.generating,
+        Book.created_at < deadline
+    ).to_list()
+
+    for book in stale_books:
+        if not book.scene:
+            update = {"$set": {"status": BookStatus.failed}}
+        else:
+            eager_scene_ids = story_graph.scenes_until_decision(book.scene) if book.lazy_media else None
+            update = {
+                "$set": {"status": BookStatus.in_progress},
+                "$addToSet": {"pending_media": {"$each": _missing_media_items(book, eager_scene_ids)}}
+            }
+
+        # still generating in the match, a job that finished meanwhile is left alone
+        await _update_book(book.id, update, {"status": BookStatus.generating})
+        logger.warning("stale book generation recovered", extra={"fields": {"book_id": str(book.id), "has_story": bool(book.scene)}})
+
+def _missing_media_items(book: Book, scene_ids: list = None) -> list:
+    '''
+    the {"scene_id", "type"} of every media item the book does not have yet,
+    scene_ids (optional) limits it to these scenes
+    '''
+    missing = [] if book.cover_img_url else [{"scene_id": None, "type": "cover_image"}]
+    for scene in book.scene:
+        if scene_ids is not None and scene.get("scene_id") not in scene_ids:
+            continue
+        if not scene.get("img_url"):
+            missing.append({"scene_id": scene.get("scene_id"), "type": "image"})
+        # books created before the voice was stored can not be narrated later
+        if not scene.get("voice_url") and book.voice_name_code:
+            missing.append({"scene_id": scene.get("scene_id"), "type": "voice"})
+    return missing
+
+async def _repair_book_media(book: Book):
+    pending = book.pending_media
+    pending_keys = {(item.get("scene_id"), item.get("type")) for item in pending}
+    scene_ids = list(dict.fromkeys(item.get("scene_id") for item in pending if item.get("scene_id") is not None))
+
+    requests = _build_media_requests(
+        {"scene": book.scene, "characters": book.characters, "cover_img_description": book.cover_img_description},
+        book.voice_name_code,
+        book.language_code,
+        scene_ids,
+        include_cover=(None, "cover_image") in pending_keys
+    )
+    requests = [request for request in requests if (request.get("scene_id"), request.get("type")) in pending_keys]
+
+    scene_index = {scene.get("scene_id"): index for index, scene in enumerate(book.scene)}
+
+    async def store_media_result(item: dict):
+        if item.get("error"):
+            return
+        await _store_media_result(book.id, scene_index, item)
+
+        # a generated cover is reported on scene 1, it is pending without a scene
+        repaired = _pending_media_item(item)
+        if item.get("type") == "cover_image":
+            repaired["scene_id"] = None
+        await _update_book(book.id, {"$pull": {"pending_media": repaired}})
+
+    try:
+        async with stage("media_generation"):
+            await generate_multiple_image_and_voice_concurrently(requests, on_complete=store_media_result)
+    finally:
+        await _update_book(book.id, {"$set": {"repair_lease_until": None}})
+
 def _is_voice_name_code_invalid(language: str, target_voice_name_code: str) -> bool:
     language_country_code = LANGUAGE_NORMALIZATION.get(language,None)
     if not language_country_code:
@@ -155,13 +510,200 @@ def _is_voice_name_code_invalid(language: str, target_voice_name_code: str) -> b
 
     raise HTTPException(status_code= 400, detail= f"voice code is not found")
 
-async def get_books(current_user):
-    books = await Book.find(Book.user_id == current_user.get("id")).to_list()
+async def get_books(current_user, limit: int = None, cursor: str = None, since: datetime = None):
+    '''
+    newest first, one page of book cards at a time.
+    limit (optional): the page size, without it every book is sent in one response
+    (clients that do not follow next_cursor yet).
+    cursor: next_cursor of the previous page.
+    since (optional): only books created after it, for a client that already has the older ones
+    '''
+    filters = [Book.user_id == current_user.get("id")]
+    if since:
+        filters.append(Book.created_at > since)
+    if cursor:
+        created_at, book_id = _decode_cursor(cursor)
+        # keyset pagination, the id breaks the tie between books created at the same time
+        filters.append(Or(
+            Book.created_at < created_at,
+            And(Book.created_at == created_at, Book.id < book_id)
+        ))
+
+    query = Book.find(*filters).sort(-Book.created_at, -Book.id)
+    if limit is None:
+        books = await query.project(BookCardView).to_list()
+        return {"data": _format_book_cards(books), "next_cursor": None}
+
+    # one more than the page, to know whether there is a next page without counting
+    books = await query.limit(limit + 1).project(BookCardView).to_list()
+
+    next_cursor = _encode_cursor(books[limit - 1]) if len(books) > limit else None
+
     return {
-        "data": _format_book_cards(books)
+        "data": _format_book_cards(books[:limit]),
+        "next_cursor": next_cursor
     }
 
-async def get_book_by_id(id: str, current_user):
+def _encode_cursor(book: BookCardView) -> str:
+    payload = json.dumps([book.created_at.isoformat(), str(book.id)])
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii")
+
+def _decode_cursor(cursor: str) -> tuple:
+    try:
+        created_at, book_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return datetime.fromisoformat(created_at), PydanticObjectId(book_id)
+    except (ValueError, TypeError, InvalidId):
+        raise HTTPException(status_code= 400, detail= "invalid cursor")
+
+async def get_book_by_id(id: str, current_user, if_none_match: str = None):
+    '''
+    answers from the serialized body cache when it can, and with 304 when the
+    client already has the current version (If-None-Match)
+    '''
+    cached = book_cache.get(id)
+    if cached:
+        user_id = current_user.get("id")
+        if cached["user_id"] != user_id:
+            raise HTTPException(status_code= 403, detail= f"book with id {id} not belong to user with id ${user_id}")
+    else:
+        token = book_cache.read_token()
+        book = await _get_owned_book(id, current_user)
+        cached = book_cache.put(str(book.id), book.user_id, book.version, json_response.dumps({"data": book.model_dump(by_alias=True, exclude=BOOK_INTERNAL_FIELDS)}), token)
+
+    headers = {
+        "ETag": cached["etag"],
+        # the client may keep the book but has to ask whether it is still current
+        "Cache-Control": "private, no-cache"
+    }
+    if _etag_matches(if_none_match, cached["etag"]):
+        return Response(status_code=304, headers=headers)
+
+    return Response(content=cached["body"], media_type="application/json", headers=headers)
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # If-None-Match uses the weak comparison
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+async def update_book_progress(id: str, body: book_schema.update_book_progress_schema, current_user):
+    '''
+    applies one reading event in a single atomic update that touches only the progress
+    fields, the scenes are never read or written, so the cost does not grow with the book
+    '''
+    try:
+        book_id = PydanticObjectId(id)
+    except InvalidId:
+        raise HTTPException(status_code= 404, detail= f"book with id {id} not found")
+    user_id = current_user.get("id")
+
+    update = _progress_update(body)
+    result = await _update_book(
+        book_id,
+        update,
+        # the event id check is in the same match, so a retry racing the original is a no-op
+        {"user_id": user_id, "applied_progress_events": {"$ne": body.event_id}}
+    )
+
+    if not result.matched_count:
+        owner = await Book.find_one(Book.id == book_id, projection_model=BookOwnerView)
+        if not owner:
+            raise HTTPException(status_code= 404, detail= f"book with id {id} not found")
+        if owner.user_id != user_id:
+            raise HTTPException(status_code= 403, detail= f"book with id {id} not belong to user with id ${user_id}")
+
+        return {
+            "message": "progress event already applied",
+            "data": {"id": id, "event_id": body.event_id}
+        }
+
+    if body.current_scene is not None:
+        # the reader moved on, get the media of the scenes ahead ready
+        run_in_background(_prefetch_after_progress(book_id, body.current_scene, user_id))
+
+    return {
+        "message": "successfully update book progress",
+        "data": {"id": id, "event_id": body.event_id}
+    }
+
+def _progress_update(body: book_schema.update_book_progress_schema) -> dict:
+    set_fields = {}
+    inc_fields = {}
+    push_fields = {
+        "applied_progress_events": {"$each": [body.event_id], "$slice": -PROGRESS_EVENT_HISTORY}
+    }
+
+    if body.current_scene is not None:
+        set_fields["current_scene"] = body.current_scene
+        push_fields["user_story.visited_scene"] = body.current_scene
+
+    if body.choice:
+        push_fields["user_story.choices"] = body.choice.model_dump()
+        inc_fields["user_story.total_point"] = body.choice.point
+
+    if body.reading_time:
+        inc_fields["user_story.finished_time"] = body.reading_time
+
+    if body.finished:
+        set_fields["status"] = BookStatus.finished
+        set_fields["finished_at"] = datetime.utcnow()
+
+    update = {"$push": push_fields}
+    if set_fields:
+        update["$set"] = set_fields
+    if inc_fields:
+        update["$inc"] = inc_fields
+    return update
+
+async def _prefetch_after_progress(book_id: PydanticObjectId, scene_id: int, user_id: str):
+    try:
+        # only lazy books have media left to generate, the others are not even loaded
+        book = await Book.find_one(Book.id == book_id, Book.user_id == user_id, Book.lazy_media == True)
+        if book:
+            _start_prefetch(book, scene_id)
+    except Exception:
+        logger.exception("media prefetch after a progress update failed", extra={"fields": {"book_id": str(book_id)}})
+
+async def get_book_generation(id: str, current_user):
+    book = await _get_owned_book(id, current_user)
+
+    return {
+        "data": _generation_progress(book)
+    }
+
+async def stream_book_generation(id: str, current_user):
+    book = await _get_owned_book(id, current_user)
+    book_id = book.id
+
+    async def event_stream():
+        last_progress = None
+        while True:
+            current_book = await Book.get(book_id)
+            if not current_book:
+                return
+
+            progress = _generation_progress(current_book)
+            if progress != last_progress:
+                yield f"data: {json.dumps(progress)}\n\n"
+                last_progress = progress
+
+            if progress["status"] != BookStatus.generating:
+                return
+
+            await asyncio.sleep(PROGRESS_POLL_INTERVAL)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "Connection": "keep-alive",
+        },
+    )
+
+async def _get_owned_book(id: str, current_user) -> Book:
     book = await Book.get(id)
     if not book:
         raise HTTPException(status_code= 404, detail= f"book with id {id} not found")
@@ -170,8 +712,31 @@ async def get_book_by_id(id: str, current_user):
     if book.user_id != user_id:
         raise HTTPException(status_code= 403, detail= f"book with id {id} not belong to user with id ${user_id}")
 
+    return book
+
+def _generation_progress(book: Book) -> dict:
+    scenes = [
+        {
+            "scene_id": scene.get("scene_id"),
+            "image": bool(scene.get("img_url")),
+            "voice": bool(scene.get("voice_url"))
+        }
+        for scene in book.scene
+    ]
+    cover_image = bool(book.cover_img_url)
+    first_scene = scenes[0] if scenes else None
+
     return {
-        "data": book
+        "id": str(book.id),
+        "status": book.status,
+        "cover_image": cover_image,
+        "scenes": scenes,
+        "completed_items": int(cover_image) + sum(scene["image"] + scene["voice"] for scene in scenes),
+        "total_items": 1 + 2 * len(scenes),
+        # failed items waiting for the repair job
+        "pending_items": len(book.pending_media),
+        # the client can open the book as soon as the cover and the first scene are ready
+        "readable": cover_image and bool(first_scene) and first_scene["image"] and first_scene["voice"]
     }
 
 def _add_character_description(characters: list, img_description: str) -> str:
@@ -199,7 +764,8 @@ def _format_book_cards(books: list) -> list:
             title= book.title,
             description= book.description,
             language= book.language,
-            cover_img_url= book.cover_img_url,
+            # the card only needs the thumbnail, older books fall back to the full cover
+            cover_img_url= book.cover_thumb_url or book.cover_img_url,
             estimation_time_to_read= _time_estimation_format(book.estimated_reading_time),
             created_at= str(book.created_at)
         )
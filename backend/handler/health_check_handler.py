@@ -1,2 +1,27 @@
+from utils.scheduler import media_scheduler
+from utils import media_cache
+from utils import ai
+from utils import api_request
+from utils import index_report
+from utils import book_cache
+from utils import metrics as prometheus_metrics
+from fastapi import Response
+
 def health_check():
-    return "ok"
\ No newline at end of file
+    return "ok"
+
+def health_status():
+    return {
+        "status": "ok",
+        "media_scheduler": media_scheduler.stats(),
+        "media_cache": media_cache.stats(),
+        "media_provider_pools": ai.pool_stats(),
+        "media_provider_routing": ai.routing_stats(),
+        "http_client_pool": api_request.pool_stats(),
+        "mongo_indexes": index_report.stats(),
+        "book_cache": book_cache.stats()
+    }
+
+def metrics():
+    body, content_type = prometheus_metrics.render()
+    return Response(content=body, media_type=content_type)
@@ -8,20 +8,59 @@ from fastapi.middleware.cors import CORSMiddleware
 from beanie import init_beanie
 from setting.settings import settings
 from routes import routers
+from utils import ai
+from utils import api_request
+from utils import index_report
+from utils import ttl_index
+from utils.json_response import ORJSONResponse
+from utils.background import run_in_background, run_periodically
+from handler import book_handler
 from models.user import User
 from models.book import Book
+from models.media_cache import MediaCache
+from models.idempotency_record import IdempotencyRecord
 import uvicorn
+from utils.logger import configure_logging, get_logger, RequestIdMiddleware
+from utils.metrics import configure_metrics
+
+configure_logging("backend", settings.LOG_LEVEL)
+configure_metrics("backend")
+logger = get_logger(__name__)
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     client = AsyncIOMotorClient(settings.MONGODB_URL)
+    document_models = [User,Book,MediaCache,IdempotencyRecord]
+    # before the index build, which would fail on a TTL index whose setting changed
+    await ttl_index.sync_ttl_indexes(client[settings.MONGODB_DB], document_models)
     await init_beanie(
         database=client[settings.MONGODB_DB],
-        document_models=[User,Book],
+        document_models=document_models,
+        skip_indexes=True,
     )
+    # one by one, a failed build is reported instead of stopping the startup
+    await index_report.create_indexes(document_models)
+    run_in_background(index_report.report_indexes(document_models))
+
+    await api_request.open_client()
+
+    try:
+        await ai.warmup()
+    except Exception as e:
+        # a cold provider is slower but still works, never block the startup on it
+        logger.warning(f"media provider warmup failed: {e}")
+
+    repair_job = run_in_background(
+        run_periodically(book_handler.repair_pending_media, settings.MEDIA_REPAIR_INTERVAL)
+    )
+
     yield
 
-app = FastAPI(lifespan=lifespan)
+    repair_job.cancel()
+    await ai.shutdown()
+    await api_request.close_client()
+
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
 
 app.add_middleware(
     CORSMiddleware,
@@ -30,6 +69,7 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(RequestIdMiddleware)
 
 for router in routers:
     app.include_router(router)
@@ -1,2 +1,4 @@
 from .user import User
-from .book import Book
\ No newline at end of file
+from .book import Book
+from .media_cache import MediaCache
+from .idempotency_record import IdempotencyRecord
\ No newline at end of file
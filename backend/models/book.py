@@ -1,26 +1,75 @@
-from beanie import Document
-from pydantic import Field
+from beanie import Document, PydanticObjectId
+from pydantic import BaseModel, Field
+from pymongo import IndexModel, ASCENDING, DESCENDING
 from typing import Optional
 from datetime import datetime
+from enum import Enum
+
+class BookStatus(str, Enum):
+    generating = "generating"
+    failed = "failed"
+    in_progress = "in_progress"
+    finished = "finished"
 
 class Book(Document):
     user_id: str
-    title: str
-    theme: list
+    title: str = ""
+    theme: list = Field(default_factory=list)
     language: str
     status: str
     age_group: int
-    current_scene: int
+    current_scene: int = 1
     created_at: Optional[datetime] = Field(default_factory=datetime.utcnow)
     finished_at: Optional[datetime] = None
-    maximum_point: int
-    story_flow: dict
-    characters: list
-    scene: list
-    user_story: dict
+    maximum_point: int = 0
+    story_flow: dict = Field(default_factory=dict)
+    characters: list = Field(default_factory=list)
+    scene: list = Field(default_factory=list)
+    user_story: dict = Field(default_factory=dict)
     cover_img_url: Optional[str] = None
-    description: str
-    estimated_reading_time: int
+    cover_thumb_url: Optional[str] = None
+    description: str = ""
+    estimated_reading_time: int = 0
+    # kept to narrate the scenes that are generated after the book is created
+    voice_name_code: Optional[str] = None
+    language_code: Optional[str] = None
+    # only the scenes up to the first decision got media up front, the rest is prefetched
+    lazy_media: bool = False
+    cover_img_description: str = ""
+    # media that failed to generate, {"scene_id", "type"} each, filled in later by the repair job
+    pending_media: list = Field(default_factory=list)
+    repair_attempts: int = 0
+    repair_lease_until: Optional[datetime] = None
+    # bumped by every write, the ETag of the book is built from it
+    version: int = 0
+    # ids of the latest reading progress events, a retried event is not applied twice
+    applied_progress_events: list = Field(default_factory=list)
 
     class Settings:
         name = "books"
+        indexes = [
+            # the books list and its keyset cursor, the id breaks ties in the sort
+            IndexModel(
+                [("user_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)],
+                name="user_id_created_at"
+            ),
+            # the books of one user in one state, e.g. the finished ones
+            IndexModel([("user_id", ASCENDING), ("status", ASCENDING)], name="user_id_status"),
+        ]
+
+class BookCardView(BaseModel):
+    '''
+    projection of the fields a book card shows, the list never loads the scenes
+    '''
+    id: PydanticObjectId = Field(alias="_id")
+    title: str = ""
+    language: str
+    description: str = ""
+    estimated_reading_time: int = 0
+    cover_img_url: Optional[str] = None
+    cover_thumb_url: Optional[str] = None
+    created_at: Optional[datetime] = None
+
+class BookOwnerView(BaseModel):
+    id: PydanticObjectId = Field(alias="_id")
+    user_id: str
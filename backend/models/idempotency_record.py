@@ -0,0 +1,32 @@
+from beanie import Document
+from pydantic import Field
+from pymongo import IndexModel, ASCENDING
+from typing import Optional
+from datetime import datetime
+from enum import Enum
+from setting.settings import settings
+
+class IdempotencyStatus(str, Enum):
+    in_progress = "in_progress"
+    completed = "completed"
+
+class IdempotencyRecord(Document):
+    user_id: str
+    key: str
+    fingerprint: str
+    status: IdempotencyStatus = IdempotencyStatus.in_progress
+    response: Optional[dict] = None
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    # renewed while the job runs, a record past it was left behind by a stopped instance
+    lease_until: Optional[datetime] = None
+
+    class Settings:
+        name = "idempotency_records"
+        indexes = [
+            # one record per key and user, the insert is the lock
+            IndexModel([("user_id", ASCENDING), ("key", ASCENDING)], unique=True),
+            IndexModel(
+                [("created_at", ASCENDING)],
+                expireAfterSeconds=settings.IDEMPOTENCY_TTL_HOURS * 60 * 60
+            ),
+        ]
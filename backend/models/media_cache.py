@@ -0,0 +1,26 @@
+from beanie import Document
+from pydantic import Field
+from pymongo import IndexModel, ASCENDING
+from datetime import datetime
+from setting.settings import settings
+
+class MediaCache(Document):
+    key: str
+    kind: str
+    url: str
+    # what else is known about the blob, e.g. the duration and size of a narration
+    meta: dict = Field(default_factory=dict)
+    hits: int = 0
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    last_used_at: datetime = Field(default_factory=datetime.utcnow)
+
+    class Settings:
+        name = "media_cache"
+        indexes = [
+            IndexModel([("key", ASCENDING)], unique=True),
+            # entries that are not used for MEDIA_CACHE_TTL_DAYS are evicted by mongo
+            IndexModel(
+                [("last_used_at", ASCENDING)],
+                expireAfterSeconds=settings.MEDIA_CACHE_TTL_DAYS * 24 * 60 * 60
+            ),
+        ]
@@ -1,5 +1,6 @@
 from beanie import Document
 from pydantic import Field
+from pymongo import IndexModel, ASCENDING
 from typing import Optional
 from datetime import datetime
 from enum import Enum
@@ -19,3 +20,14 @@ class User(Document):
 
     class Settings:
         name = "users"
+        indexes = [
+            IndexModel([("email", ASCENDING)], unique=True, name="email"),
+            # local accounts store google_id as null, which a sparse index still indexes,
+            # so only real ids take part in the unique check. equality lookups imply the filter
+            IndexModel(
+                [("google_id", ASCENDING)],
+                unique=True,
+                partialFilterExpression={"google_id": {"$gt": ""}},
+                name="google_id"
+            ),
+        ]
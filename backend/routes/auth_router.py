@@ -1,4 +1,5 @@
-from fastapi import APIRouter,Query
+from fastapi import APIRouter,Query,Depends
+from utils.api_request import get_http_client
 from handler import auth_handler
 from schema.request import auth_schema
 
@@ -18,6 +19,7 @@ async def login(
 
 @router.get("/api/v1/auth/google", status_code=200)
 async def auth_google(
-    code: str = Query(...)
+    code: str = Query(...),
+    client = Depends(get_http_client)
 ):
-    return await auth_handler.google_login(code)
\ No newline at end of file
+    return await auth_handler.google_login(code, client)
\ No newline at end of file
@@ -1,6 +1,8 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Header, Query
+from typing import Optional
+from datetime import datetime
 from middleware.auth_middleware import get_current_user
-from schema.request.book_schema import create_book_schema
+from schema.request.book_schema import create_book_schema, prefetch_book_media_schema, update_book_progress_schema
 from handler import book_handler
 
 router = APIRouter()
@@ -8,19 +10,55 @@ router = APIRouter()
 @router.post("/api/v1/book", status_code=201)
 async def register(
     body: create_book_schema,
-    current_user = Depends(get_current_user)
+    current_user = Depends(get_current_user),
+    idempotency_key: Optional[str] = Header(default=None, alias="Idempotency-Key")
 ):
-    return await book_handler.create_book(body, current_user)
+    return await book_handler.create_book(body, current_user, idempotency_key)
 
 @router.get("/api/v1/books", status_code=200)
 async def get_books(
+    limit: Optional[int] = Query(None, ge=1, le=100),
+    cursor: Optional[str] = Query(None),
+    since: Optional[datetime] = Query(None),
     current_user = Depends(get_current_user)
 ):
-    return await book_handler.get_books(current_user)
+    return await book_handler.get_books(current_user, limit, cursor, since)
 
 @router.get("/api/v1/book/{id}", status_code=200)
 async def get_book_by_id(
     id: str,
+    current_user = Depends(get_current_user),
+    if_none_match: Optional[str] = Header(default=None, alias="If-None-Match")
+):
+    return await book_handler.get_book_by_id(id,current_user,if_none_match)
+
+@router.get("/api/v1/book/{id}/generation", status_code=200)
+async def get_book_generation(
+    id: str,
+    current_user = Depends(get_current_user)
+):
+    return await book_handler.get_book_generation(id,current_user)
+
+@router.patch("/api/v1/book/{id}/progress", status_code=200)
+async def update_book_progress(
+    id: str,
+    body: update_book_progress_schema,
+    current_user = Depends(get_current_user)
+):
+    return await book_handler.update_book_progress(id,body,current_user)
+
+@router.get("/api/v1/book/{id}/generation/stream", status_code=200)
+async def stream_book_generation(
+    id: str,
+    current_user = Depends(get_current_user)
+):
+    return await book_handler.stream_book_generation(id,current_user)
+
+
+@router.post("/api/v1/book/{id}/prefetch", status_code=202)
+async def prefetch_book_media(
+    id: str,
+    body: prefetch_book_media_schema,
     current_user = Depends(get_current_user)
 ):
-    return await book_handler.get_book_by_id(id,current_user)
+    return await book_handler.prefetch_book_media(id,body,current_user)
\ No newline at end of file
@@ -4,4 +4,12 @@ router = APIRouter()
 
 @router.get("/ping") 
 def health_check():
-    return health_check_handler.health_check()
\ No newline at end of file
+    return health_check_handler.health_check()
+
+@router.get("/health")
+def health_status():
+    return health_check_handler.health_status()
+
+@router.get("/metrics")
+def metrics():
+    return health_check_handler.metrics()
@@ -1,4 +1,5 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
+from typing import Optional
 from enum import Enum
 
 class language_enum(str, Enum):
@@ -28,6 +29,29 @@ class create_book_schema(BaseModel):
     voice_name_code: str = "en-US-Chirp3-HD-Achernar"
     language: language_enum = language_enum.ENGLISH
     country: country_enum
+    # when true the book id is returned right away and the media is generated in the background
+    is_async: bool = False
+    # when true only the scenes up to the first decision point get media, the rest is prefetched while reading
+    lazy_media: bool = False
+
+class prefetch_book_media_schema(BaseModel):
+    # the scene the reader is on
+    scene_id: int
+
+class progress_choice_schema(BaseModel):
+    scene_id: int
+    # "baik" or "buruk", what the analytics count as a good or bad decision
+    choice: str
+    point: int = 0
+
+class update_book_progress_schema(BaseModel):
+    # made by the client once per reading event, a retried event is applied only once
+    event_id: str = Field(min_length=1, max_length=64)
+    current_scene: Optional[int] = Field(default=None, ge=1)
+    choice: Optional[progress_choice_schema] = None
+    # seconds read since the previous event
+    reading_time: int = Field(default=0, ge=0)
+    finished: bool = False
 
 class get_book_by_id_schema(BaseModel):
     id: str
\ No newline at end of file
@@ -19,6 +19,47 @@ class Settings(BaseSettings):
     BUCKET_STORAGE_SERVICE_ACCOUNT_JSON_NAME: str
     VERTEX_AI_SERVICE_ACCOUNT_JSON_NAME: str
     CLOUD_PLATFORM_OPTION: str
+    MEDIA_IMAGE_CONCURRENCY: int = 8
+    MEDIA_VOICE_CONCURRENCY: int = 8
+    MEDIA_UPLOAD_CONCURRENCY: int = 16
+    MEDIA_CACHE_TTL_DAYS: int = 30
+    MEDIA_CACHE_MEMORY_SIZE: int = 4096
+    MEDIA_PROVIDER_FAILOVER: bool = True  # fall back to the other cloud's image / voice provider
+    MEDIA_HEDGE_MIN_DELAY: float = 2.0  # sec, a hedged request is never sent earlier
+    MEDIA_HEDGE_MIN_SAMPLES: int = 20  # latency samples needed before hedging starts
+    MEDIA_CIRCUIT_FAILURE_THRESHOLD: int = 5  # consecutive failures that open the circuit
+    MEDIA_CIRCUIT_RESET_TIMEOUT: int = 30  # sec
+    MEDIA_RETRY_ATTEMPTS: int = 3
+    MEDIA_RETRY_BASE_DELAY: float = 1.0  # sec, doubled on every attempt
+    MEDIA_REPAIR_INTERVAL: int = 60  # sec between two runs of the pending media repair
+    MEDIA_REPAIR_LEASE: int = 600  # sec a book stays claimed by one repair run
+    MEDIA_REPAIR_MAX_ATTEMPTS: int = 5
+    BOOK_GENERATION_TIMEOUT: int = 1800  # sec, a book still generating after that lost its background job
+    MEDIA_PREFETCH_DEPTH: int = 2  # scenes ahead of the reader, along every branch
+    TTS_POOL_SIZE: int = 4
+    TTS_SYNTHESIS_TIMEOUT: int = 60  # sec
+    TTS_BATCH_MODE: bool = False  # read the whole book in one request and split the audio per scene
+    TTS_BATCH_MAX_BYTES: int = 5000  # of ssml per batch request, google accepts at most 5000
+    TTS_AUDIO_FORMAT: str = "mp3"  # mp3, ogg_opus or wav, mp3 plays on every mobile browser
+    TTS_AUDIO_BITRATE: str = "48k"  # used when the audio is compressed on our side
+    IMAGEN_WARMUP_GENERATION: bool = False  # costs one image per process start
+    IMAGE_WEBP_QUALITY: int = 80
+    IMAGE_THUMBNAIL_WIDTH: int = 256  # px, the height keeps the aspect ratio
+    IMAGE_ENCODE_WORKERS: int = 2  # processes
+    IDEMPOTENCY_TTL_HOURS: int = 24
+    IDEMPOTENCY_WAIT_TIMEOUT: int = 300  # sec a retry waits for the job running in another instance
+    IDEMPOTENCY_LEASE: int = 60  # sec a running job holds its key without a heartbeat, then a retry takes over
+    HTTP_CLIENT_MAX_CONNECTIONS: int = 100
+    HTTP_CLIENT_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    HTTP_CLIENT_KEEPALIVE_EXPIRY: float = 30.0  # sec
+    HTTP_CLIENT_HTTP2: bool = False  # needs the h2 package
+    SSE_HEARTBEAT_INTERVAL: float = 15.0  # sec without upstream data before a heartbeat comment
+    SSE_VALIDATION_SAMPLE_RATE: float = 0.0  # share of proxied chunks checked for valid json
+    LOG_LEVEL: str = "INFO"
+    LOG_STREAM_SAMPLE_RATE: float = 0.01  # share of proxied stream chunks that are logged
+    BOOK_CACHE_SIZE: int = 512  # serialized books kept for repeat opens
+    BOOK_CACHE_TTL: int = 60  # sec, bounds staleness from writes made by other instances
+    STORAGE_UPLOAD_CHUNK_SIZE: int = 4 * 1024 * 1024  # must be a multiple of 256 KiB for google cloud storage
 
     model_config = SettingsConfigDict(
         env_file=".env",
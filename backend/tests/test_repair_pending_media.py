@@ -0,0 +1,74 @@
+'''
+one run of the pending media repair gives every book a single attempt, even when
+the attempt fails and the book still has pending media afterwards
+
+run from the backend directory (the settings come from its .env):
+    python -m pytest tests
+'''
+import asyncio
+from datetime import datetime
+from types import SimpleNamespace
+from bson import ObjectId
+from handler import book_handler
+from setting.settings import settings
+
+class _FakeClaim:
+    '''
+    the find_one(...).update(...) of the claim in repair_pending_media, over a list of
+    books, understands the keys of its filter and update
+    '''
+    def __init__(self, books: list, query: dict):
+        self.books = books
+        self.query = query
+
+    def _matches(self, book) -> bool:
+        now = datetime.utcnow()
+        return (
+            book.id not in self.query["_id"]["$nin"]
+            and bool(book.pending_media)
+            and book.status != self.query["status"]["$ne"]
+            and book.repair_attempts < self.query["repair_attempts"]["$lt"]
+            and (book.repair_lease_until is None or book.repair_lease_until < now)
+        )
+
+    async def update(self, update: dict, response_type=None):
+        for book in self.books:
+            if self._matches(book):
+                book.repair_lease_until = update["$set"]["repair_lease_until"]
+                book.repair_attempts += update["$inc"]["repair_attempts"]
+                return book
+        return None
+
+def _book() -> SimpleNamespace:
+    return SimpleNamespace(
+        id=ObjectId(),
+        status="in_progress",
+        pending_media=[{"scene_id": 1, "type": "image"}],
+        repair_attempts=0,
+        repair_lease_until=None
+    )
+
+def test_one_attempt_per_book_per_run(monkeypatch):
+    monkeypatch.setattr(settings, "MEDIA_REPAIR_MAX_ATTEMPTS", 5)
+    books = [_book(), _book()]
+    attempts = []
+
+    async def failing_repair(book):
+        # the provider is down: nothing gets repaired and the lease is released
+        attempts.append(book.id)
+        book.repair_lease_until = None
+
+    async def no_stale_generations():
+        return None
+
+    monkeypatch.setattr(book_handler.Book, "find_one", lambda query: _FakeClaim(books, query))
+    monkeypatch.setattr(book_handler, "_repair_book_media", failing_repair)
+    monkeypatch.setattr(book_handler, "_recover_stale_generations", no_stale_generations)
+
+    asyncio.run(book_handler.repair_pending_media())
+    assert attempts == [books[0].id, books[1].id]
+
+    # the next run tries them again, one attempt each
+    asyncio.run(book_handler.repair_pending_media())
+    assert attempts == [books[0].id, books[1].id] * 2
+    assert all(book.repair_attempts == 2 for book in books)
@@ -1,27 +1,307 @@
+from fastapi.concurrency import run_in_threadpool
 from setting.settings import settings
+from utils.storage import upload_file_async
+from utils.scheduler import media_scheduler, IMAGE, VOICE, UPLOAD, COVER_PRIORITY
+from utils import media_cache
+from utils import audio
+from utils import image
 from . import azure_text_to_speech
 from . import nebius_flux_1_schnell
 from . import google_text_to_speech
 from . import google_imagen
+from .router import ProviderRouter
+from utils.retry import retry_with_backoff
+import asyncio
+from utils.logger import get_logger
+from utils.metrics import stage
+
+logger = get_logger(__name__)
 
 CLOUD_PLATFORM_OPTION = settings.CLOUD_PLATFORM_OPTION
+IMAGE_FOLDER_NAME = "images"
+VOICE_FOLDER_NAME = "voices"
 
-async def generate_image(image_prompt: str) -> str:
+def _image_provider():
     if CLOUD_PLATFORM_OPTION == "google":
-        return await google_imagen.generate_image(image_prompt)
-    
-    return await nebius_flux_1_schnell.generate_image(image_prompt)
+        return google_imagen
+
+    return nebius_flux_1_schnell
 
-async def synthesize_speech(request: any) -> dict:
+def _voice_provider():
     if CLOUD_PLATFORM_OPTION == "google":
-        return await google_text_to_speech.synthesize_speech(request)
-    
-    return await azure_text_to_speech.synthesize_speech(request)
+        return google_text_to_speech
+
+    return azure_text_to_speech
+
+def _router(stage_name: str, primary, fallback, hedge_same_provider: bool = False) -> ProviderRouter:
+    if settings.MEDIA_PROVIDER_FAILOVER and fallback.is_configured():
+        return ProviderRouter(stage_name, [primary, fallback], hedge_same_provider)
+    return ProviderRouter(stage_name, [primary], hedge_same_provider)
+
+image_router = _router("image_generation", _image_provider(), nebius_flux_1_schnell if _image_provider() is google_imagen else google_imagen)
+# a hedge on the other provider would switch the narrator mid story, voice hedges stay on the primary
+voice_router = _router("tts", _voice_provider(), azure_text_to_speech if _voice_provider() is google_text_to_speech else google_text_to_speech, hedge_same_provider=True)
+
+def _voice_for(provider, request: dict):
+    # the requested voice only exists on the primary provider
+    if provider is voice_router.primary:
+        return request.get("voice_name_code")
+    return provider.default_voice(request.get("language_code"))
+
+async def _upload(data: bytes, folder_name: str, blob_filename: str, priority: int) -> str:
+    async with media_scheduler.slot(UPLOAD, priority):
+        async with stage("upload"):
+            return await upload_file_async(data, folder_name, blob_filename)
+
+def _image_cache_key(provider, prompt: str) -> str:
+    return media_cache.build_key(
+        IMAGE,
+        provider=provider.PROVIDER_NAME,
+        prompt=prompt,
+        params=provider.CACHE_KEY_PARAMS,
+        encoding=image.ENCODING_PARAMS
+    )
+
+async def generate_image(image_prompt: dict) -> dict:
+    scene_id = image_prompt.get("scene_id") or 1
+    image_type = image_prompt.get("type")
+    priority = image_prompt.get("priority", COVER_PRIORITY)
+    prompt = image_prompt.get("prompt")
+    cache_key = _image_cache_key(image_router.primary, prompt)
+    cached = await media_cache.get(IMAGE, cache_key) or {}
+    url = cached.get("url")
+    thumbnail_url = cached.get("thumbnail_url")
+
+    if not url:
+        provider, image_bytes = await image_router.call(
+            lambda provider: provider.generate_image(prompt),
+            slot=lambda: media_scheduler.slot(IMAGE, priority)
+        )
+
+        # a fail over renders with other parameters, store it under that provider's key
+        cache_key = _image_cache_key(provider, prompt)
+        # providers answer in their own format (imagen sends png), re-encode before the upload
+        async with stage("image_encode"):
+            variants = await image.encode_variants(image_bytes)
+        url, thumbnail_url = await asyncio.gather(
+            _upload(variants["full"], IMAGE_FOLDER_NAME, f"{cache_key}.{image.IMAGE_FORMAT}", priority),
+            _upload(variants["thumbnail"], IMAGE_FOLDER_NAME, f"{cache_key}_thumb.{image.IMAGE_FORMAT}", priority)
+        )
+        await media_cache.put(IMAGE, cache_key, url, thumbnail_url=thumbnail_url)
+
+    if image_type == "cover_image":
+        return {
+            "scene_id": scene_id,
+            "type": "cover_image",
+            "cover_image": url,
+            "cover_image_thumb": thumbnail_url
+        }
+
+    return {
+        "scene_id": scene_id,
+        "type": "image",
+        "image": url,
+        "image_thumb": thumbnail_url
+    }
+
+def _voice_cache_key(provider, request: dict) -> str:
+    # the same voice reading the same text always gives the same audio
+    return media_cache.build_key(
+        VOICE,
+        provider=provider.PROVIDER_NAME,
+        voice_name_code=request.get("voice_name_code"),
+        language_code=request.get("language_code"),
+        text=media_cache.normalize_text(request.get("prompt")),
+        audio_format=provider.AUDIO_FORMAT
+    )
+
+def _voice_result(request: dict, cached: dict) -> dict:
+    return {
+        "scene_id": request.get("scene_id"),
+        "type": "voice",
+        "voice": cached.get("url"),
+        "voice_duration": cached.get("duration"),
+        "voice_size": cached.get("size")
+    }
+
+async def _store_voice(provider, request: dict, cache_key: str, audio_bytes: bytes, source_format: str) -> dict:
+    # providers that hand out uncompressed audio are compressed here before the upload
+    async with stage("transcode", provider=provider.PROVIDER_NAME):
+        audio_bytes = await audio.transcode(audio_bytes, source_format, provider.AUDIO_FORMAT)
+    meta = {
+        "duration": await audio.duration(audio_bytes, provider.AUDIO_FORMAT),
+        "size": len(audio_bytes)
+    }
+
+    blob_filename = f"{cache_key}.{provider.AUDIO_EXTENSION}"
+    blob_url = await _upload(audio_bytes, VOICE_FOLDER_NAME, blob_filename, request.get("priority", COVER_PRIORITY))
+    await media_cache.put(VOICE, cache_key, blob_url, **meta)
+
+    return _voice_result(request, {**meta, "url": blob_url})
+
+async def synthesize_speech(request: dict) -> dict:
+    priority = request.get("priority", COVER_PRIORITY)
+    text_content = request.get("prompt")
+    language_code = request.get("language_code")
+
+    cached = await media_cache.get(VOICE, _voice_cache_key(voice_router.primary, request))
+    if cached:
+        return _voice_result(request, cached)
+
+    async def synthesize(provider) -> bytes:
+        return await provider.synthesize_speech(text_content, _voice_for(provider, request), language_code)
+
+    provider, audio_bytes = await voice_router.call(synthesize, slot=lambda: media_scheduler.slot(VOICE, priority))
+
+    cache_key = _voice_cache_key(provider, {**request, "voice_name_code": _voice_for(provider, request)})
+    return await _store_voice(provider, request, cache_key, audio_bytes, provider.AUDIO_FORMAT)
+
+def _batch_groups(provider, pending: list) -> list:
+    '''
+    groups the scenes that share a voice into requests under the ssml byte budget,
+    keeping the reading order inside every group
+    '''
+    groups = []
+    open_groups = {}
+    for request, cache_key in pending:
+        voice = (request.get("voice_name_code"), request.get("language_code"))
+        group = open_groups.get(voice)
+
+        if group is None or _batch_size(provider, [item for item, _ in group] + [request]) > settings.TTS_BATCH_MAX_BYTES:
+            group = []
+            open_groups[voice] = group
+            groups.append(group)
+
+        group.append((request, cache_key))
+
+    return groups
+
+def _batch_size(provider, requests: list) -> int:
+    # thai, chinese or tamil text takes about 3 bytes per character, count the real ssml
+    return provider.batch_ssml_size(
+        [request.get("prompt") for request in requests],
+        requests[0].get("voice_name_code"),
+        requests[0].get("language_code")
+    )
+
+async def _synthesize_group(provider, items: list, on_complete) -> list:
+    requests = [request for request, _ in items]
+    priority = min(request.get("priority", COVER_PRIORITY) for request in requests)
+
+    try:
+        async with media_scheduler.slot(VOICE, priority):
+            async with stage("tts_batch", provider=provider.PROVIDER_NAME):
+                audio_parts = await provider.synthesize_speech_batch(
+                    [request.get("prompt") for request in requests],
+                    requests[0].get("voice_name_code"),
+                    requests[0].get("language_code")
+                )
+    except Exception as e:
+        # a failed batch costs one round trip, read the scenes one by one instead
+        logger.warning(f"batch speech synthesis failed, falling back to per scene: {e}")
+        return await asyncio.gather(*(notify(resilient(synthesize_speech, request), on_complete) for request in requests))
+
+    def store(cache_key: str, audio_bytes: bytes):
+        return lambda request: _store_voice(provider, request, cache_key, audio_bytes, provider.BATCH_AUDIO_FORMAT)
+
+    return await asyncio.gather(*(
+        notify(resilient(store(cache_key, audio_bytes), request), on_complete)
+        for (request, cache_key), audio_bytes in zip(items, audio_parts)
+    ))
+
+async def synthesize_speech_batch(requests: list, on_complete=None) -> list:
+    '''
+    reads many scenes with as few provider requests as possible, one audio stream is
+    cut per scene at the marks the provider reports. scenes that are too long for a
+    batch or whose voice can not report marks take the per scene path.
+    on_complete (optional) is awaited with every single result as soon as it is ready
+    '''
+    provider = voice_router.primary
+    tasks = []
+    pending = []
+
+    for request in requests:
+        if (
+            len(request.get("prompt")) > provider.TEXT_CONTENT_THRESHOLD
+            or not provider.supports_batch(request.get("voice_name_code"))
+            # a scene that alone is over the budget would fail every batch it is in
+            or _batch_size(provider, [request]) > settings.TTS_BATCH_MAX_BYTES
+        ):
+            tasks.append(notify(resilient(synthesize_speech, request), on_complete))
+            continue
+
+        cache_key = _voice_cache_key(provider, request)
+        cached = await media_cache.get(VOICE, cache_key)
+        if cached:
+            tasks.append(notify(_ready(_voice_result(request, cached)), on_complete))
+        else:
+            pending.append((request, cache_key))
+
+    groups = [_synthesize_group(provider, items, on_complete) for items in _batch_groups(provider, pending)]
+    results = await asyncio.gather(*tasks, *groups)
+
+    # the group results are lists, flatten them back to one result per scene
+    flat_results = []
+    for result in results:
+        flat_results.extend(result if isinstance(result, list) else [result])
+    return flat_results
+
+async def resilient(generate, request: dict) -> dict:
+    '''
+    runs generate(request) with retries, a request that still fails gives a result with
+    an error instead of raising, so one item never fails the whole book
+    '''
+    try:
+        return await retry_with_backoff(lambda: generate(request))
+    except Exception as e:
+        logger.warning(f"{request.get('type')} of scene {request.get('scene_id')} failed: {e}")
+        return {
+            "scene_id": request.get("scene_id"),
+            "type": request.get("type"),
+            "error": str(e)
+        }
+
+async def _ready(result: dict) -> dict:
+    return result
+
+async def notify(task, on_complete):
+    '''
+    awaits task, then on_complete (optional) with its result
+    '''
+    result = await task
+    if on_complete:
+        await on_complete(result)
+    return result
+
+async def warmup():
+    # open the TTS connections and load the image model before the first book needs them
+    await asyncio.gather(
+        run_in_threadpool(_voice_provider().warmup),
+        run_in_threadpool(_image_provider().warmup)
+    )
+
+async def shutdown():
+    # a fail over may have opened the pools of the fallback providers too
+    for provider in voice_router.providers + image_router.providers:
+        await run_in_threadpool(provider.close_pool)
+    image.shutdown()
+
+def pool_stats() -> dict:
+    return {
+        "tts": _voice_provider().pool_stats(),
+        "image": _image_provider().pool_stats()
+    }
+
+def routing_stats() -> dict:
+    return {
+        "image": image_router.stats(),
+        "voice": voice_router.stats()
+    }
 
 def get_available_voices():
     if CLOUD_PLATFORM_OPTION == "google":
         return google_text_to_speech.AVAILABLE_VOICES
-    
+
     return azure_text_to_speech.AVAILABLE_VOICES
 
-AVAILABLE_VOICES = get_available_voices()
\ No newline at end of file
+AVAILABLE_VOICES = get_available_voices()
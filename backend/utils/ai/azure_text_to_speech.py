@@ -1,16 +1,34 @@
 import azure.cognitiveservices.speech as speechsdk
-from utils.storage import upload_file
-from fastapi.concurrency import run_in_threadpool
 from fastapi import HTTPException
 from setting.settings import settings
-from uuid import uuid4
-import base64
-import threading
+import asyncio
+import queue
 import time
+from xml.sax.saxutils import escape
+from utils import audio
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
 
 speech_key = settings.MICROSOFT_AZURE_TEXT_TO_SPEECH_RESOURCE_KEY
 speech_endpoint = "https://eastasia.api.cognitive.microsoft.com/"
-folder_name = "voices"
+PROVIDER_NAME = "azure"
+AUDIO_FORMAT = settings.TTS_AUDIO_FORMAT
+AUDIO_EXTENSION = audio.AUDIO_EXTENSIONS[AUDIO_FORMAT]
+# the batch audio is cut per scene, so it has to stay uncompressed
+BATCH_AUDIO_FORMAT = audio.WAV
+
+OUTPUT_FORMATS = {
+    audio.WAV: speechsdk.SpeechSynthesisOutputFormat.Riff24Khz16BitMonoPcm,
+    audio.MP3: speechsdk.SpeechSynthesisOutputFormat.Audio24Khz48KBitRateMonoMp3,
+    audio.OGG_OPUS: speechsdk.SpeechSynthesisOutputFormat.Ogg24Khz16BitMonoOpus,
+}
+# approximate bytes per second of audio, only used for the real time factor check
+OUTPUT_BYTE_RATES = {
+    audio.WAV: 48000,
+    audio.MP3: 6000,
+    audio.OGG_OPUS: 3000,
+}
 
 AVAILABLE_VOICES = {
     "en-US-JennyMultilingualNeural": {
@@ -62,18 +80,161 @@ LANGUAGE_CODE = {
     "indonesian": "id-ID"
 }
 
-CLIENT_TIMEOUT = 3000000
+DEFAULT_VOICE = "en-US-JennyMultilingualNeural"
+
+CLIENT_TIMEOUT = settings.TTS_SYNTHESIS_TIMEOUT
 SERVICE_TIMEOUT_THRESHOLD = 3000000
 TEXT_CONTENT_THRESHOLD = 1500
 
-def _synthesize_speech(request: any) -> dict:
-    scene_id = request.get("scene_id")
-    text_content = request.get("prompt")
-    voice_name_code = request.get("voice_name_code")
-    language = request.get("language")
+class _PooledSynthesizer:
+    '''
+    a synthesizer keeps its websocket open between requests, so it is reused instead of
+    being built per scene. the voice comes from the ssml, so any synthesizer can speak
+    any voice. one synthesizer serves one request at a time.
+    '''
+    def __init__(self, audio_format: str):
+        speech_config = speechsdk.SpeechConfig(subscription=speech_key, endpoint=speech_endpoint)
+        speech_config.set_property(speechsdk.PropertyId.SpeechServiceResponse_RequestSentenceBoundary, "false")
+        speech_config.set_speech_synthesis_output_format(OUTPUT_FORMATS[audio_format])
+        self.byte_rate = OUTPUT_BYTE_RATES[audio_format]
+
+        self.synthesizer = speechsdk.SpeechSynthesizer(speech_config=speech_config, audio_config=None)
+        self.connection = speechsdk.Connection.from_speech_synthesizer(self.synthesizer)
+        self.synthesizer.synthesizing.connect(self._audio_chunk_cb)
+        self.synthesizer.synthesis_completed.connect(self._result_cb)
+        self.synthesizer.synthesis_canceled.connect(self._result_cb)
+        self.synthesizer.bookmark_reached.connect(self._bookmark_cb)
+
+        self._loop = None
+        self._future = None
+        self.exception = None
+        self.bookmarks = []
+        self.start_time = time.time()
+        self.audio_size = 0
+
+    def open(self):
+        self.connection.open(True)
+
+    def close(self):
+        self.connection.close()
+
+    def _audio_chunk_cb(self, evt):
+        self.audio_size += len(evt.audio_data)
+        elapsed = time.time() - self.start_time
+
+        if self.audio_size > 0:
+            approx_duration = self.audio_size / self.byte_rate
+            current_rtf = elapsed / approx_duration if approx_duration > 0 else 0
+            
+            if current_rtf > SERVICE_TIMEOUT_THRESHOLD:
+                self.synthesizer.stop_speaking_async()
+                self.exception = HTTPException(
+                    status_code=408,
+                    detail=f"Service performance threshold exceeded (RTF: {current_rtf:.2f})"
+                )
+
+    def _bookmark_cb(self, evt):
+        # audio_offset is in ticks of 100 nanoseconds
+        self.bookmarks.append((evt.text, evt.audio_offset / 10_000_000))
+
+    def _result_cb(self, evt):
+        # runs on an sdk thread, hand the result over to the event loop that is waiting for it
+        loop, future = self._loop, self._future
+        if loop and future:
+            loop.call_soon_threadsafe(self._resolve, future, evt.result)
+
+    @staticmethod
+    def _resolve(future: asyncio.Future, result):
+        if not future.done():
+            future.set_result(result)
+
+    async def speak(self, ssml: str, timeout: float = CLIENT_TIMEOUT):
+        self.exception = None
+        self.bookmarks = []
+        self.start_time = time.time()
+        self.audio_size = 0
+        self._loop = asyncio.get_running_loop()
+        self._future = self._loop.create_future()
+
+        # the sdk future is not waited on, completion arrives through the synthesis events
+        self.synthesizer.speak_ssml_async(ssml)
+
+        try:
+            result = await asyncio.wait_for(self._future, timeout=timeout)
+        except asyncio.TimeoutError:
+            self.synthesizer.stop_speaking_async()
+            raise HTTPException(
+                status_code=408,
+                detail=f"Speech synthesis timed out after {timeout} seconds"
+            )
+        except asyncio.CancelledError:
+            self.synthesizer.stop_speaking_async()
+            raise
+
+        if self.exception:
+            raise self.exception
+
+        return result
+
+class _SynthesizerPool:
+    def __init__(self, audio_format: str):
+        self.audio_format = audio_format
+        self._idle = queue.LifoQueue()
+
+    def acquire(self) -> _PooledSynthesizer:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            # the media scheduler bounds the concurrent syntheses, so does the pool size
+            return _PooledSynthesizer(self.audio_format)
+
+    def release(self, pooled: _PooledSynthesizer):
+        self._idle.put(pooled)
 
-    language_code = LANGUAGE_CODE.get(language)
+    def discard(self, pooled: _PooledSynthesizer):
+        # an interrupted synthesizer may still deliver late events, never hand it out again
+        pooled.close()
 
+    def warmup(self, size: int):
+        for _ in range(size - self._idle.qsize()):
+            pooled = _PooledSynthesizer(self.audio_format)
+            pooled.open()
+            self.release(pooled)
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+    def stats(self) -> dict:
+        return {"idle_synthesizers": self._idle.qsize()}
+
+_synthesizer_pool = _SynthesizerPool(AUDIO_FORMAT)
+_batch_synthesizer_pool = _SynthesizerPool(BATCH_AUDIO_FORMAT)
+
+def is_configured() -> bool:
+    return bool(speech_key)
+
+def default_voice(language_code: str):
+    # used when another provider fails over to this one, multilingual voices read every language
+    return DEFAULT_VOICE
+
+def warmup():
+    _synthesizer_pool.warmup(settings.TTS_POOL_SIZE)
+
+def close_pool():
+    _synthesizer_pool.close()
+    _batch_synthesizer_pool.close()
+
+def pool_stats() -> dict:
+    return {
+        **_synthesizer_pool.stats(),
+        "idle_batch_synthesizers": _batch_synthesizer_pool.stats()["idle_synthesizers"]
+    }
+
+async def synthesize_speech(text_content: str, voice_name_code: str, language_code: str) -> bytes:
     if len(text_content) > TEXT_CONTENT_THRESHOLD:
         raise HTTPException(
             status_code=400,
@@ -88,77 +249,58 @@ def _synthesize_speech(request: any) -> dict:
     </speak>
     """
 
-    speech_config = speechsdk.SpeechConfig(subscription=speech_key, endpoint=speech_endpoint)
-    speech_config.speech_synthesis_voice_name = voice_name_code
-    speech_config.set_property(speechsdk.PropertyId.SpeechServiceResponse_RequestSentenceBoundary, "false")
-
-    speech_synthesizer = speechsdk.SpeechSynthesizer(speech_config=speech_config, audio_config=None)
-
-    class ResultContainer:
-        def __init__(self):
-            self.result = None
-            self.exception = None
-            self.start_time = time.time()
-            self.audio_size = 0
+    pooled = _synthesizer_pool.acquire()
+    try:
+        result = await pooled.speak(ssml)
+    except BaseException:
+        _synthesizer_pool.discard(pooled)
+        raise
+    _synthesizer_pool.release(pooled)
 
-    container = ResultContainer()
-
-    def audio_chunk_cb(evt):
-        container.audio_size += len(evt.audio_data)
-        elapsed = time.time() - container.start_time
-
-        if container.audio_size > 0:
-            approx_duration = container.audio_size / 32000
-            current_rtf = elapsed / approx_duration if approx_duration > 0 else 0
-            
-            if current_rtf > SERVICE_TIMEOUT_THRESHOLD:
-                speech_synthesizer.stop_speaking_async()
-                container.exception = HTTPException(
-                    status_code=408,
-                    detail=f"Service performance threshold exceeded (RTF: {current_rtf:.2f})"
-                )
+    return _audio_data(result)
 
-    speech_synthesizer.synthesizing.connect(audio_chunk_cb)
+def supports_batch(voice_name_code: str) -> bool:
+    # every azure neural voice reports bookmarks
+    return True
 
-    def worker():
-        try:
-            container.result = speech_synthesizer.speak_ssml_async(ssml).get()
-        except Exception as e:
-            container.exception = e
+def _batch_ssml(text_contents: list, voice_name_code: str, language_code: str) -> str:
+    body = "".join(
+        f"<bookmark mark='{audio.scene_mark(index)}'/>{escape(text_content)} "
+        for index, text_content in enumerate(text_contents)
+    )
+    return f"""
+    <speak version='1.0' xml:lang='{language_code}'>
+        <voice name='{voice_name_code}'>
+            <lang xml:lang='{language_code}'>{body}</lang>
+        </voice>
+    </speak>
+    """
 
-    t = threading.Thread(target=worker)
-    t.start()
-    t.join(timeout=CLIENT_TIMEOUT)
+def batch_ssml_size(text_contents: list, voice_name_code: str, language_code: str) -> int:
+    return len(_batch_ssml(text_contents, voice_name_code, language_code).encode("utf-8"))
 
-    if t.is_alive():
-        speech_synthesizer.stop_speaking_async()
-        t.join(timeout=2)
-        raise HTTPException(
-            status_code=408,
-            detail=f"Speech synthesis timed out after {CLIENT_TIMEOUT} seconds"
-        )
+async def synthesize_speech_batch(text_contents: list, voice_name_code: str, language_code: str) -> list:
+    '''
+    reads every text in one request, a bookmark in front of each text tells where
+    its audio starts, returns one wav file per text in the same order
+    '''
+    ssml = _batch_ssml(text_contents, voice_name_code, language_code)
 
-    if container.exception:
-        raise container.exception
+    pooled = _batch_synthesizer_pool.acquire()
+    try:
+        result = await pooled.speak(ssml, timeout=CLIENT_TIMEOUT * len(text_contents))
+        bookmarks = list(pooled.bookmarks)
+    except BaseException:
+        _batch_synthesizer_pool.discard(pooled)
+        raise
+    _batch_synthesizer_pool.release(pooled)
 
-    result = container.result
+    offsets = audio.mark_offsets(bookmarks, len(text_contents))
+    return audio.split_wav(_audio_data(result), offsets)
 
+def _audio_data(result) -> bytes:
     if result.reason == speechsdk.ResultReason.SynthesizingAudioCompleted:
-        audio_data = result.audio_data
-        base64_audio = base64.b64encode(audio_data).decode("utf-8")
-        filename = f"{uuid4()}.wav"
-
-        blob_url = upload_file(
-            base64_string=base64_audio, 
-            folder_name=folder_name,
-            blob_filename=filename
-        )
-
-        return {
-            "scene_id": scene_id,
-            "type": "voice",
-            "voice": blob_url
-        }
+        return result.audio_data
 
     elif result.reason == speechsdk.ResultReason.Canceled:
         cancellation_details = result.cancellation_details
@@ -173,11 +315,8 @@ def _synthesize_speech(request: any) -> dict:
         if cancellation_details.reason == speechsdk.CancellationReason.Error:
             error_msg += f" — {cancellation_details.error_details}"
         
-        print(error_msg)
+        logger.error(error_msg)
         raise HTTPException(
             status_code=500,
             detail="Speech synthesis was canceled by the service"
         )
-
-async def synthesize_speech(request: any) -> dict:
-    return await run_in_threadpool(_synthesize_speech, request)
\ No newline at end of file
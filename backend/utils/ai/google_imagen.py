@@ -1,17 +1,27 @@
 import os
-import base64
+import threading
 import vertexai
-from uuid import uuid4
+from fastapi import HTTPException
 from fastapi.concurrency import run_in_threadpool
 from vertexai.preview.vision_models import ImageGenerationModel
-from utils.storage import upload_file
 from google.oauth2 import service_account
 from setting.settings import settings
 
 IMAGEN_MODEL = "imagen-4.0-fast-generate-001"
-IMAGE_FOLDER_NAME = "images"
+IMAGE_EXTENSION = "webp"
 VERTEX_AI_REGION = "asia-southeast1"
 IMAGE_ASPECT_RATIO = "9:16"
+PROVIDER_NAME = "google_imagen"
+
+GENERATION_PARAMS = {
+    "number_of_images": 1,
+    "negative_prompt": "unproportional, blur, distorted, text dialog.",
+    "aspect_ratio": IMAGE_ASPECT_RATIO,
+    "person_generation": "allow_all",
+    "safety_filter_level": "block_most",
+    "add_watermark": True,
+}
+CACHE_KEY_PARAMS = {"model": IMAGEN_MODEL, **GENERATION_PARAMS}
 
 FILE_DIR = os.path.dirname(os.path.abspath(__file__))
 BASE_DIR = os.path.dirname(os.path.dirname(FILE_DIR))
@@ -20,52 +30,62 @@ KEYS_PATH = os.path.join(BASE_DIR, "keys")
 CREDENTIALS_FILE_PATH = os.path.join(
     KEYS_PATH, settings.VERTEX_AI_SERVICE_ACCOUNT_JSON_NAME
 )
-vertex_ai_credentials = service_account.Credentials.from_service_account_file(CREDENTIALS_FILE_PATH)
 
-vertexai.init(
-    project=vertex_ai_credentials.project_id,
-    location=VERTEX_AI_REGION,
-    credentials=vertex_ai_credentials
-)
+WARMUP_PROMPT = "a small paper boat on a calm lake, children's book illustration"
+
+# resolving the model metadata is a round trip of its own, do it once per process
+_model = None
+_model_lock = threading.Lock()
+_warmed_up = False
 
-def _generate_image(image_prompt):
-    scene_id = image_prompt.get("scene_id") or 1
-    prompt = image_prompt.get("prompt")
-    image_type = image_prompt.get("type")
-    client = ImageGenerationModel.from_pretrained(IMAGEN_MODEL)
-    response = client.generate_images(
-        prompt=prompt,
-        number_of_images=1,
-        negative_prompt="unproportional, blur, distorted, text dialog.",
-        aspect_ratio=IMAGE_ASPECT_RATIO,
-        person_generation="allow_all",
-        safety_filter_level="block_most",
-        add_watermark=True,
+def _load_model() -> ImageGenerationModel:
+    vertex_ai_credentials = service_account.Credentials.from_service_account_file(CREDENTIALS_FILE_PATH)
+
+    vertexai.init(
+        project=vertex_ai_credentials.project_id,
+        location=VERTEX_AI_REGION,
+        credentials=vertex_ai_credentials
     )
-    image_result = response.images[0]
-    b64_string = base64.b64encode(image_result._image_bytes).decode('utf-8')
-    url = None
-  
-    if b64_string:
-        unique_id = str(uuid4())
-        url = upload_file(
-            base64_string=b64_string,
-            folder_name=IMAGE_FOLDER_NAME,
-            blob_filename=f"{unique_id}.webp"
-        )
-
-    if image_type == "cover_image":
-        return {
-            "scene_id": scene_id,
-            "type": "cover_image",
-            "cover_image": url
-        }
-
-    return { 
-        "scene_id": scene_id,
-        "type": "image",
-        "image": url
+    return ImageGenerationModel.from_pretrained(IMAGEN_MODEL)
+
+def _get_model() -> ImageGenerationModel:
+    global _model
+    with _model_lock:
+        if _model is None:
+            _model = _load_model()
+        return _model
+
+def is_configured() -> bool:
+    return os.path.exists(CREDENTIALS_FILE_PATH)
+
+def warmup():
+    global _warmed_up
+    model = _get_model()
+
+    if settings.IMAGEN_WARMUP_GENERATION and not _warmed_up:
+        # the first generation of a process is noticeably slower than the rest
+        model.generate_images(prompt=WARMUP_PROMPT, **GENERATION_PARAMS)
+        _warmed_up = True
+
+def close_pool():
+    global _model, _warmed_up
+    with _model_lock:
+        _model = None
+        _warmed_up = False
+
+def pool_stats() -> dict:
+    return {
+        "model": IMAGEN_MODEL,
+        "model_ready": _model is not None,
+        "warmed_up": _warmed_up
     }
 
-async def generate_image(image_prompt):
-    return await run_in_threadpool(_generate_image, image_prompt)
\ No newline at end of file
+def _generate_image(prompt: str) -> bytes:
+    response = _get_model().generate_images(prompt=prompt, **GENERATION_PARAMS)
+    if not response.images:
+        # e.g. dropped by the safety filter, fail so it is retried instead of stored without image
+        raise HTTPException(status_code=502, detail="Image generation returned no image")
+    return response.images[0]._image_bytes
+
+async def generate_image(prompt: str) -> bytes:
+    return await run_in_threadpool(_generate_image, prompt)
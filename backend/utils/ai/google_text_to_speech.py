@@ -1,15 +1,29 @@
 import os
-import base64
 import json
-from uuid import uuid4
+import itertools
+import threading
 from fastapi.concurrency import run_in_threadpool
 from fastapi import HTTPException
 from google.cloud import texttospeech_v1beta1 as texttospeech
 from google.oauth2 import service_account
 from setting.settings import settings
-from utils.storage import upload_file
+from utils import audio
+from xml.sax.saxutils import escape
+from utils.logger import get_logger
 
-folder_name = "voices"
+logger = get_logger(__name__)
+
+PROVIDER_NAME = "google"
+AUDIO_FORMAT = settings.TTS_AUDIO_FORMAT
+AUDIO_EXTENSION = audio.AUDIO_EXTENSIONS[AUDIO_FORMAT]
+# the batch audio is cut per scene, so it has to stay uncompressed
+BATCH_AUDIO_FORMAT = audio.WAV
+
+AUDIO_ENCODINGS = {
+    audio.WAV: texttospeech.AudioEncoding.LINEAR16,
+    audio.MP3: texttospeech.AudioEncoding.MP3,
+    audio.OGG_OPUS: texttospeech.AudioEncoding.OGG_OPUS,
+}
 TEXT_CONTENT_THRESHOLD = 2000
 API_ENDPOINT_REGION = "asia-southeast1-texttospeech.googleapis.com"
 FILE_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -27,7 +41,7 @@ def load_available_voices():
         with open(os.path.join(VOICE_AVAILABILITY_PATH, VOICE_AVAILABILITY_JSON_FILENAME), 'r') as f:
             available_voices = json.load(f)
     except FileNotFoundError:
-        print(f"WARNING: Voice availability JSON file not found at {VOICE_AVAILABILITY_PATH}. Using an empty voice list.")
+        logger.warning(f"Voice availability JSON file not found at {VOICE_AVAILABILITY_PATH}. Using an empty voice list.")
     return available_voices
 
 def load_credentials():
@@ -40,20 +54,51 @@ def load_credentials():
 CHRIP_CREDENTIAL = load_credentials()
 AVAILABLE_VOICES = load_available_voices()
 
-def _synthesize_speech(request) -> dict:
-    scene_id = request.get("scene_id")
-    text_content = request.get("prompt")
-    voice_code = request.get("voice_name_code")
-    language_code = request.get("language_code")
+# gRPC clients are thread safe, a few warm channels are shared round robin by every scene
+_clients = []
+_client_counter = itertools.count()
+_clients_lock = threading.Lock()
+
+def _create_client() -> texttospeech.TextToSpeechClient:
+    client_options = {"api_endpoint": API_ENDPOINT_REGION}
+    return texttospeech.TextToSpeechClient(credentials=CHRIP_CREDENTIAL, client_options=client_options)
+
+def _get_client() -> texttospeech.TextToSpeechClient:
+    with _clients_lock:
+        if not _clients:
+            _clients.extend(_create_client() for _ in range(settings.TTS_POOL_SIZE))
+        return _clients[next(_client_counter) % len(_clients)]
+
+def is_configured() -> bool:
+    return os.path.exists(CREDENTIALS_FILE_PATH)
 
+def default_voice(language_code: str):
+    # used when another provider fails over to this one, its voice codes mean nothing here
+    voices = AVAILABLE_VOICES.get(language_code) or []
+    return voices[0].get("voice_code") if voices else None
+
+def warmup():
+    # the first call on a channel pays the connection setup, do it before the first book
+    for _ in range(settings.TTS_POOL_SIZE):
+        _get_client().list_voices(language_code="en-US")
+
+def close_pool():
+    with _clients_lock:
+        for client in _clients:
+            client.transport.close()
+        _clients.clear()
+
+def pool_stats() -> dict:
+    return {"grpc_clients": len(_clients)}
+
+def _synthesize_speech(text_content: str, voice_code: str, language_code: str) -> bytes:
     if len(text_content) > TEXT_CONTENT_THRESHOLD:
         raise HTTPException(
             status_code=400,
             detail=f"Text too long. Please limit to {TEXT_CONTENT_THRESHOLD} characters per request."
         )
 
-    client_options = {"api_endpoint": API_ENDPOINT_REGION}
-    client = texttospeech.TextToSpeechClient(credentials=CHRIP_CREDENTIAL, client_options=client_options)
+    client = _get_client()
     synthesis_input = texttospeech.SynthesisInput(text=text_content)
     
     voice_params = texttospeech.VoiceSelectionParams(
@@ -62,7 +107,7 @@ def _synthesize_speech(request) -> dict:
     )
 
     audio_config = texttospeech.AudioConfig(
-        audio_encoding=texttospeech.AudioEncoding.MP3
+        audio_encoding=AUDIO_ENCODINGS[AUDIO_FORMAT]
     )
 
     try:
@@ -77,20 +122,53 @@ def _synthesize_speech(request) -> dict:
             detail=f"Google Cloud TTS API error: {e}"
         )
 
-    audio_data = response.audio_content
-    base64_audio = base64.b64encode(audio_data).decode("utf-8")
-    filename = f"{uuid4()}.mp3"
-    blob_url = upload_file(
-        base64_string=base64_audio,
-        folder_name=folder_name,
-        blob_filename=filename
+    return response.audio_content
+
+async def synthesize_speech(text_content: str, voice_name_code: str, language_code: str) -> bytes:
+    return await run_in_threadpool(_synthesize_speech, text_content, voice_name_code, language_code)
+
+def supports_batch(voice_name_code: str) -> bool:
+    # chirp 3 HD voices do not accept ssml, so they can not report marks. every voice
+    # in voice_availability.json is one of them, only other voices take the batch path
+    return "Chirp3-HD" not in voice_name_code
+
+def _batch_ssml(text_contents: list) -> str:
+    body = "".join(
+        f'<mark name="{audio.scene_mark(index)}"/>{escape(text_content)} '
+        for index, text_content in enumerate(text_contents)
+    )
+    return f"<speak>{body}</speak>"
+
+def batch_ssml_size(text_contents: list, voice_name_code: str, language_code: str) -> int:
+    # the request limit counts the bytes of the whole ssml, marks and escaping included
+    return len(_batch_ssml(text_contents).encode("utf-8"))
+
+def _synthesize_speech_batch(text_contents: list, voice_code: str, language_code: str) -> list:
+    client = _get_client()
+    request = texttospeech.SynthesizeSpeechRequest(
+        input=texttospeech.SynthesisInput(ssml=_batch_ssml(text_contents)),
+        voice=texttospeech.VoiceSelectionParams(
+            language_code=language_code,
+            name=voice_code,
+        ),
+        # uncompressed audio can be cut at any sample, linear16 comes with a wav header
+        audio_config=texttospeech.AudioConfig(
+            audio_encoding=AUDIO_ENCODINGS[BATCH_AUDIO_FORMAT]
+        ),
+        enable_time_pointing=[texttospeech.SynthesizeSpeechRequest.TimepointType.SSML_MARK]
     )
 
-    return {
-        "scene_id": scene_id,
-        "type": "voice",
-        "voice": blob_url
-    }
+    try:
+        response = client.synthesize_speech(request=request)
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Google Cloud TTS API error: {e}"
+        )
+
+    marks = [(timepoint.mark_name, timepoint.time_seconds) for timepoint in response.timepoints]
+    offsets = audio.mark_offsets(marks, len(text_contents))
+    return audio.split_wav(response.audio_content, offsets)
 
-async def synthesize_speech(request: any) -> dict:
-    return await run_in_threadpool(_synthesize_speech, request)
+async def synthesize_speech_batch(text_contents: list, voice_name_code: str, language_code: str) -> list:
+    return await run_in_threadpool(_synthesize_speech_batch, text_contents, voice_name_code, language_code)
@@ -1,64 +1,63 @@
+from fastapi import HTTPException
 from fastapi.concurrency import run_in_threadpool
-from utils.storage import upload_file
 from openai import OpenAI
 from setting.settings import settings
-from uuid import uuid4
+import base64
 import json
 
 FLUX_1_SCHNELL_HOST = "https://api.studio.nebius.com/v1/"
 FLUX_1_SCHNELL_MODEL = "black-forest-labs/flux-schnell"
 FLUX_1_SCHNELL_IMAGE_RESPONSE_FORMAT = "b64_json" # b64_json or url
-IMAGE_FOLDER_NAME = "images"
+IMAGE_EXTENSION = "webp"
+PROVIDER_NAME = "nebius_flux_1_schnell"
+
+# fixed seed and settings, the same prompt always renders the same image
+GENERATION_PARAMS = {
+    "response_extension": IMAGE_EXTENSION,
+    "width": 512,
+    "height": 1024,
+    "num_inference_steps": 4,
+    "negative_prompt": "unproportional, blur, distorted.",
+    "seed": 1,
+    "loras": None
+}
+CACHE_KEY_PARAMS = {"model": FLUX_1_SCHNELL_MODEL, **GENERATION_PARAMS}
 
 client = OpenAI(
     base_url=FLUX_1_SCHNELL_HOST,
     api_key=settings.FLUX_1_SCHNELL_API_KEY
 )
 
-def _generate_image(image_prompt):
-    scene_id = image_prompt.get("scene_id") or 1
-    prompt = image_prompt.get("prompt")
-    image_type = image_prompt.get("type")
+def is_configured() -> bool:
+    return bool(settings.FLUX_1_SCHNELL_API_KEY)
 
+def warmup():
+    # the openai client is created at import and connects on the first request
+    pass
+
+def close_pool():
+    client.close()
+
+def pool_stats() -> dict:
+    return {"model": FLUX_1_SCHNELL_MODEL, "model_ready": True}
+
+def _generate_image(prompt: str) -> bytes:
     response = client.images.generate(
         model=FLUX_1_SCHNELL_MODEL,
         response_format=FLUX_1_SCHNELL_IMAGE_RESPONSE_FORMAT,
-        extra_body={
-            "response_extension": "webp",
-            "width": 512,
-            "height": 1024,
-            "num_inference_steps": 4,
-            "negative_prompt": "unproportional, blur, distorted.",
-            "seed": 1,
-            "loras": None
-        },
+        extra_body=GENERATION_PARAMS,
         prompt= f"{prompt}"
     )
     json_result = json.loads(response.to_json())
     image_result = json_result.get("data")[0]
     b64_string = image_result.get("b64_json")
-    url = image_result.get("url")
-
-    if b64_string:
-        unique_id =  str(uuid4())
-        url = upload_file(
-            base64_string=b64_string,
-            folder_name=IMAGE_FOLDER_NAME,
-            blob_filename= f"{unique_id}.webp"
-        )
 
-    if image_type == "cover_image":  
-        return {
-            "scene_id": scene_id,
-            "type": "cover_image",
-            "cover_image": url
-        }
+    if not b64_string:
+        # an image without data would be stored as a scene without image, fail so it is retried
+        raise HTTPException(status_code=502, detail="Image generation returned no image data")
 
-    return { 
-        "scene_id": scene_id,
-        "type": "image",
-        "image": url
-    }
+    # flux is the only provider that answers in base64
+    return base64.b64decode(b64_string)
 
-async def generate_image(image_prompt):
-    return await run_in_threadpool(_generate_image, image_prompt)
+async def generate_image(prompt: str) -> bytes:
+    return await run_in_threadpool(_generate_image, prompt)
@@ -0,0 +1,207 @@
+import asyncio
+import time
+from collections import deque
+from contextlib import nullcontext
+from setting.settings import settings
+from utils.logger import get_logger
+from utils.metrics import stage, count
+from utils.background import run_in_background
+
+logger = get_logger(__name__)
+
+'''
+routes a generation to one of several providers of the same kind (image or voice).
+every provider has its own latency samples and circuit breaker: after a run of
+failures it is skipped until the reset timeout passes, then one request probes it
+while the others keep skipping it until the probe reports back.
+a request that takes longer than the p95 of its provider gets a hedged second
+request, the first answer wins and the other one is dropped. the hedge goes to the
+next provider, or with hedge_same_provider to the same one (a voice must not change
+narrator just because a scene was slow). a failed request fails over to the next
+provider right away.
+every attempt takes its own scheduler slot and keeps it until the provider call has
+really ended: a dropped call runs on in its thread, it can not be stopped.
+'''
+
+LATENCY_SAMPLE_SIZE = 200
+
+class _ProviderHealth:
+    def __init__(self):
+        self.latencies = deque(maxlen=LATENCY_SAMPLE_SIZE)
+        self.consecutive_failures = 0
+        self.opened_at = None
+        # set while the one half open request is running, cleared by its result
+        self.probing = False
+        self.probe_started_at = None
+        self.successes = 0
+        self.failures = 0
+        self.hedges = 0
+
+    def available(self) -> bool:
+        if self.opened_at is None:
+            return True
+
+        now = time.monotonic()
+        if self.probing:
+            # a probe that never reported back (e.g. never started) frees the next one in time
+            if now - self.probe_started_at < settings.MEDIA_CIRCUIT_RESET_TIMEOUT:
+                return False
+        elif now - self.opened_at < settings.MEDIA_CIRCUIT_RESET_TIMEOUT:
+            return False
+
+        # half open: the first caller after the reset timeout probes, the others wait for it
+        self.probing = True
+        self.probe_started_at = now
+        return True
+
+    def record_success(self, latency: float):
+        self.latencies.append(latency)
+        self.successes += 1
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.probing = False
+
+    def record_failure(self):
+        self.probing = False
+        self.failures += 1
+        self.consecutive_failures += 1
+        if self.consecutive_failures >= settings.MEDIA_CIRCUIT_FAILURE_THRESHOLD:
+            self.opened_at = time.monotonic()
+
+    def p95(self):
+        if len(self.latencies) < settings.MEDIA_HEDGE_MIN_SAMPLES:
+            return None
+        latencies = sorted(self.latencies)
+        return latencies[min(int(len(latencies) * 0.95), len(latencies) - 1)]
+
+    def stats(self) -> dict:
+        p95 = self.p95()
+        return {
+            "circuit": "closed" if self.opened_at is None else "open",
+            "successes": self.successes,
+            "failures": self.failures,
+            "hedges": self.hedges,
+            "latency_p95_ms": round(p95 * 1000, 1) if p95 is not None else None,
+        }
+
+class ProviderRouter:
+    def __init__(self, stage_name: str, providers: list, hedge_same_provider: bool = False):
+        self.stage_name = stage_name
+        self.hedge_same_provider = hedge_same_provider
+        # the first provider is the primary one, the others are only used to fail over or hedge
+        self.providers = providers
+        self._health = {provider.PROVIDER_NAME: _ProviderHealth() for provider in providers}
+
+    @property
+    def primary(self):
+        return self.providers[0]
+
+    def _candidates(self) -> list:
+        candidates = [provider for provider in self.providers if self._health[provider.PROVIDER_NAME].available()]
+        # with every circuit open the primary is still tried rather than failing right away
+        return candidates or [self.primary]
+
+    def _hedge_delay(self, provider):
+        p95 = self._health[provider.PROVIDER_NAME].p95()
+        if p95 is None:
+            return None
+        return max(p95, settings.MEDIA_HEDGE_MIN_DELAY)
+
+    async def _timed(self, provider, invoke, slot, started: asyncio.Event = None):
+        health = self._health[provider.PROVIDER_NAME]
+        async with slot() if slot else nullcontext():
+            if started:
+                started.set()
+            started_at = time.monotonic()
+            with stage(self.stage_name, provider=provider.PROVIDER_NAME):
+                work = asyncio.ensure_future(invoke(provider))
+                try:
+                    result = await asyncio.shield(work)
+                except asyncio.CancelledError:
+                    # the losing side of a hedge. the call goes on in its thread, the slot
+                    # is kept until it ends so the limit holds, and its result still counts
+                    # for the circuit (it may be the half open probe)
+                    await asyncio.wait([work])
+                    if not work.cancelled():
+                        if work.exception():
+                            health.record_failure()
+                        else:
+                            health.record_success(time.monotonic() - started_at)
+                    raise
+                except Exception:
+                    health.record_failure()
+                    raise
+        health.record_success(time.monotonic() - started_at)
+        return result
+
+    def _hedge_provider(self, first, candidates: list, hedged: bool):
+        if self.hedge_same_provider:
+            return None if hedged else first
+        return candidates[0] if candidates else None
+
+    async def call(self, invoke, slot=None):
+        '''
+        invoke: async function called with a provider module, returns its result.
+        slot (optional): function returning the scheduler slot every attempt holds.
+        returns (provider, result) of the first provider that answers
+        '''
+        candidates = self._candidates()
+        running = {}
+        last_error = None
+        hedged = False
+        first_started = asyncio.Event()
+
+        def start(provider, started: asyncio.Event = None):
+            # a strong reference, a dropped attempt keeps running until its call ends
+            running[run_in_background(self._timed(provider, invoke, slot, started))] = provider
+
+        first = candidates.pop(0)
+        start(first, first_started)
+        try:
+            while running:
+                hedge_provider = self._hedge_provider(first, candidates, hedged)
+
+                if hedge_provider and not first_started.is_set():
+                    # the hedge timer runs from when the first attempt holds its slot, not
+                    # while it queues, or a busy scheduler would hedge every request
+                    slot_wait = asyncio.ensure_future(first_started.wait())
+                    try:
+                        done, _ = await asyncio.wait([*running, slot_wait], return_when=asyncio.FIRST_COMPLETED)
+                    finally:
+                        slot_wait.cancel()
+                    done.discard(slot_wait)
+                    if not done:
+                        continue
+                else:
+                    # without latency samples there is nothing to compare to, so no hedge
+                    delay = self._hedge_delay(first) if hedge_provider else None
+                    done, _ = await asyncio.wait(running, timeout=delay, return_when=asyncio.FIRST_COMPLETED)
+
+                    if not done:
+                        if hedge_provider in candidates:
+                            candidates.remove(hedge_provider)
+                        hedged = True
+                        self._health[hedge_provider.PROVIDER_NAME].hedges += 1
+                        count("hedge", self.stage_name)
+                        start(hedge_provider)
+                        continue
+
+                for task in done:
+                    provider = running.pop(task)
+                    if task.exception() is None:
+                        return provider, task.result()
+
+                    last_error = task.exception()
+                    logger.warning(f"{provider.PROVIDER_NAME} failed: {last_error}")
+
+                if not running and candidates:
+                    count("failover", self.stage_name)
+                    start(candidates.pop(0))
+        finally:
+            for task in running:
+                task.cancel()
+
+        raise last_error
+
+    def stats(self) -> dict:
+        return {name: health.stats() for name, health in self._health.items()}
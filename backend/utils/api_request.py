@@ -1,39 +1,145 @@
+import asyncio
 import json
+import random
+import importlib.util
+from urllib.parse import urlparse
 from fastapi.responses import StreamingResponse
 import httpx
 from typing import Optional, Dict, Any
+from setting.settings import settings
+from utils.logger import get_logger, sampled, request_id_var, REQUEST_ID_HEADER
+
+logger = get_logger(__name__)
 
 request_timeout = 600.0  # 600 sec
+default_timeout = 5.0  # sec, the httpx default
+stream_timeout = 60.0  # sec, between two chunks of a stream
+
+SSE_HEARTBEAT = b": heartbeat\n\n"
+# a blank line ends an SSE event, the spec allows every kind of line break
+SSE_EVENT_ENDINGS = (b"\n\n", b"\r\n\r\n", b"\r\r")
+
+# per route timeouts, matched on the end of the url path, everything else uses the method default
+ROUTE_TIMEOUTS = {
+    "/generate-story": request_timeout,
+}
+
+# one client for the whole process, its connection pool keeps the connections to the
+# ai services alive between requests. opened and closed by the app lifespan.
+_client: Optional[httpx.AsyncClient] = None
+_http2 = False
+_request_count = 0
+
+
+def _http2_enabled() -> bool:
+    if not settings.HTTP_CLIENT_HTTP2:
+        return False
+    if importlib.util.find_spec("h2") is None:
+        logger.warning("HTTP_CLIENT_HTTP2 is set but the h2 package is not installed, using HTTP/1.1")
+        return False
+    return True
+
+
+def _create_client() -> httpx.AsyncClient:
+    global _http2
+    _http2 = _http2_enabled()
+    return httpx.AsyncClient(
+        http2=_http2,
+        timeout=httpx.Timeout(default_timeout),
+        limits=httpx.Limits(
+            max_connections=settings.HTTP_CLIENT_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.HTTP_CLIENT_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=settings.HTTP_CLIENT_KEEPALIVE_EXPIRY,
+        ),
+    )
+
+
+async def open_client():
+    global _client
+    if _client is None:
+        _client = _create_client()
+
+
+async def close_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """
+    The shared client, usable as a FastAPI dependency. Created on first use when
+    the lifespan did not open it (scripts, tests).
+    """
+    global _client
+    if _client is None:
+        _client = _create_client()
+    return _client
+
+
+def _timeout(url: str, default: float) -> float:
+    path = urlparse(url).path
+    for route, timeout in ROUTE_TIMEOUTS.items():
+        if path.endswith(route):
+            return timeout
+    return default
+
+
+def _forwarded_headers(headers: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+    # the ai services log under the same request id as the backend request that called them
+    request_id = request_id_var.get()
+    if not request_id:
+        return headers or {}
+    return {REQUEST_ID_HEADER: request_id, **(headers or {})}
+
+
+async def _request(method: str, url: str, timeout: float, **kwargs) -> httpx.Response:
+    global _request_count
+    _request_count += 1
+    return await get_http_client().request(method, url, timeout=_timeout(url, timeout), headers=_forwarded_headers(), **kwargs)
+
+
+def pool_stats() -> dict:
+    stats = {
+        "open": _client is not None,
+        "http2": _http2,
+        "max_connections": settings.HTTP_CLIENT_MAX_CONNECTIONS,
+        "requests": _request_count,
+    }
+    # httpx does not expose its pool, read it from the httpcore connection pool
+    pool = getattr(getattr(_client, "_transport", None), "_pool", None)
+    if pool is not None:
+        connections = pool.connections
+        stats["connections"] = len(connections)
+        stats["idle_connections"] = sum(1 for connection in connections if connection.is_idle())
+    return stats
 
 
 async def get(url: str, body: Optional[Dict[str, Any]] = None):
-    async with httpx.AsyncClient() as client:
-        response = await client.get(url, params=body)
-        return _handle_response(response)
+    response = await _request("GET", url, default_timeout, params=body)
+    return _handle_response(response)
 
 
 async def post(url: str, body: Optional[Dict[str, Any]] = None):
-    timeout = httpx.Timeout(request_timeout)
-    async with httpx.AsyncClient(timeout=timeout) as client:
-        response = await client.post(url, json=body)
-        return _handle_response(response)
+    response = await _request("POST", url, request_timeout, json=body)
+    return _handle_response(response)
 
 
 async def update(url: str, body: Optional[Dict[str, Any]] = None):
-    async with httpx.AsyncClient() as client:
-        response = await client.put(url, json=body)
-        return _handle_response(response)
+    response = await _request("PUT", url, default_timeout, json=body)
+    return _handle_response(response)
 
 
 async def delete(url: str, body: Optional[Dict[str, Any]] = None):
-    async with httpx.AsyncClient() as client:
-        response = await client.delete(url, json=body)
-        return _handle_response(response)
+    response = await _request("DELETE", url, default_timeout, json=body)
+    return _handle_response(response)
 
 
 async def _stream_from_ai(url: str, body: Optional[Dict[str, Any]] = None, headers: Optional[Dict[str, str]] = None):
     """
-    Get streaming response from AI service and properly parse SSE format
+    Get streaming response from AI service as raw bytes, the SSE framing is passed
+    through untouched so nothing is decoded, parsed or re-encoded per token.
 
     Args:
         url (str): The URL to send the request to.
@@ -41,29 +147,59 @@ async def _stream_from_ai(url: str, body: Optional[Dict[str, Any]] = None, heade
         headers (Optional[Dict[str, str]]): Headers to send with the request.
 
     Yields:
-        str: Parsed SSE data lines.
+        bytes: Chunks of the upstream SSE stream, or a heartbeat comment when the
+        upstream stays quiet for SSE_HEARTBEAT_INTERVAL seconds.
     """
-    async with httpx.AsyncClient(timeout=60.0) as client:  # Add timeout
-        async with client.stream("POST", url, json=body, headers=headers or {}) as response:
-            if response.status_code != 200:
-                error_text = await response.aread()
-                raise Exception(f"HTTP {response.status_code}: {error_text.decode()}")
-            
-            async for line in response.aiter_lines():
-                if line.strip():  # Only process non-empty lines
-                    # SSE format: "data: {json_content}"
-                    if line.startswith("data: "):
-                        try:
-                            json_content = line[6:]  # Remove "data: " prefix
-                            # Validate JSON before yielding
-                            json.loads(json_content)
-                            yield line + "\n"  # Maintain SSE format
-                        except json.JSONDecodeError as e:
-                            print(f"JSON decode error: {e}, line: {line}")
-                            continue
-                    else:
-                        # Pass through other SSE format lines (like comments)
-                        yield line + "\n"
+    global _request_count
+    _request_count += 1
+    client = get_http_client()
+    async with client.stream("POST", url, json=body, headers=_forwarded_headers(headers), timeout=_timeout(url, stream_timeout)) as response:
+        if response.status_code != 200:
+            error_text = await response.aread()
+            raise Exception(f"HTTP {response.status_code}: {error_text.decode()}")
+
+        chunks = response.aiter_bytes()
+        next_chunk = None
+        # the last bytes sent so far, an event may end in a later chunk than its data
+        tail = b"\n\n"
+        try:
+            while True:
+                # the next chunk is only read once the client took the previous one (backpressure)
+                next_chunk = next_chunk or asyncio.ensure_future(chunks.__anext__())
+                done, _ = await asyncio.wait({next_chunk}, timeout=settings.SSE_HEARTBEAT_INTERVAL)
+                if not done:
+                    # keeps proxies and mobile networks from closing an idle connection,
+                    # never sent in the middle of an upstream event
+                    if tail.endswith(SSE_EVENT_ENDINGS):
+                        yield SSE_HEARTBEAT
+                    continue
+
+                try:
+                    chunk = next_chunk.result()
+                except StopAsyncIteration:
+                    return
+                next_chunk = None
+
+                if settings.SSE_VALIDATION_SAMPLE_RATE and random.random() < settings.SSE_VALIDATION_SAMPLE_RATE:
+                    _validate_sse_chunk(chunk)
+                tail = (tail + chunk)[-4:]
+                if sampled(settings.LOG_STREAM_SAMPLE_RATE):
+                    logger.debug("proxied stream chunk", extra={"fields": {"bytes": len(chunk)}})
+                yield chunk
+        finally:
+            # also runs when the client disconnects, leaving the block closes the upstream request
+            if next_chunk and not next_chunk.done():
+                next_chunk.cancel()
+
+
+def _validate_sse_chunk(chunk: bytes):
+    # only complete lines can be checked, a chunk may end in the middle of one
+    for line in chunk.split(b"\n")[:-1]:
+        if line.startswith(b"data: "):
+            try:
+                json.loads(line[6:])
+            except ValueError as e:
+                logger.warning(f"JSON decode error in the proxied stream: {e}")
 
 
 async def stream(ai_url: str, body: Optional[Dict[str, Any]] = None, headers: Optional[Dict[str, str]] = None):
@@ -81,17 +217,15 @@ async def stream(ai_url: str, body: Optional[Dict[str, Any]] = None, headers: Op
 
     async def stream_response():
         try:
-            print(f"Starting stream from: {ai_url}")
-            print(f"Request body: {body}")
-            
-            async for line in _stream_from_ai(ai_url, body, headers):
-                print(f"Streaming line: {line.strip()}")  # Debug logging
-                yield line
-                
+            logger.info(f"Starting stream from: {ai_url}")
+
+            async for chunk in _stream_from_ai(ai_url, body, headers):
+                yield chunk
+
         except Exception as e:
-            print(f"Stream error: {str(e)}")  # Debug logging
+            logger.warning(f"Stream error: {str(e)}")
             error_data = {"content": f"Error: {str(e)}", "type": "error"}
-            yield f"data: {json.dumps(error_data)}\n\n"
+            yield f"data: {json.dumps(error_data)}\n\n".encode()
 
     return StreamingResponse(
         stream_response(),
@@ -103,6 +237,8 @@ async def stream(ai_url: str, body: Optional[Dict[str, Any]] = None, headers: Op
             "Access-Control-Allow-Origin": "*",
             "Access-Control-Allow-Headers": "*",
             "Access-Control-Allow-Methods": "*",
+            # ask nginx style proxies not to buffer the stream
+            "X-Accel-Buffering": "no",
         },
     )
 
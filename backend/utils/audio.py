@@ -0,0 +1,117 @@
+import asyncio
+import io
+import wave
+from typing import Optional
+from setting.settings import settings
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+'''
+helpers for the narration audio: cutting one long uncompressed (wav / pcm) narration
+into one file per scene, and compressing it for the readers with ffmpeg
+'''
+
+SCENE_MARK_PREFIX = "scene_"
+
+WAV = "wav"
+MP3 = "mp3"
+OGG_OPUS = "ogg_opus"
+
+AUDIO_EXTENSIONS = {
+    WAV: "wav",
+    MP3: "mp3",
+    OGG_OPUS: "ogg",
+}
+
+FFMPEG_OUTPUT_ARGS = {
+    WAV: ["-f", "wav"],
+    MP3: ["-codec:a", "libmp3lame", "-b:a", settings.TTS_AUDIO_BITRATE, "-f", "mp3"],
+    OGG_OPUS: ["-codec:a", "libopus", "-b:a", settings.TTS_AUDIO_BITRATE, "-application", "voip", "-f", "ogg"],
+}
+
+def scene_mark(index: int) -> str:
+    return f"{SCENE_MARK_PREFIX}{index}"
+
+def mark_offsets(marks: list, count: int) -> list:
+    '''
+    marks: list of (mark name, offset in seconds) as reported by the provider,
+    returns the start offset of every scene in order, fails when one is missing
+    '''
+    offsets = dict(marks)
+    missing = [scene_mark(index) for index in range(count) if scene_mark(index) not in offsets]
+    if missing:
+        raise ValueError(f"audio marks not reported by the provider: {', '.join(missing)}")
+
+    return [offsets[scene_mark(index)] for index in range(count)]
+
+def split_wav(wav_bytes: bytes, offsets: list) -> list:
+    '''
+    cuts a wav file at the given start offsets (seconds), every part keeps the
+    original format and gets its own header
+    '''
+    with wave.open(io.BytesIO(wav_bytes), "rb") as source:
+        params = source.getparams()
+        frames = source.readframes(params.nframes)
+
+    frame_size = params.sampwidth * params.nchannels
+    boundaries = [min(round(offset * params.framerate), params.nframes) for offset in offsets]
+    # the first part also keeps any leading silence before its mark
+    boundaries[0] = 0
+    boundaries.append(params.nframes)
+
+    parts = []
+    for start, end in zip(boundaries, boundaries[1:]):
+        buffer = io.BytesIO()
+        with wave.open(buffer, "wb") as target:
+            target.setparams(params)
+            target.writeframes(frames[start * frame_size:max(start, end) * frame_size])
+        parts.append(buffer.getvalue())
+
+    return parts
+
+async def transcode(data: bytes, source_format: str, target_format: str) -> bytes:
+    '''
+    converts between the narration formats, for the providers (or the batch mode)
+    that only hand out uncompressed audio
+    '''
+    if source_format == target_format:
+        return data
+
+    process = await asyncio.create_subprocess_exec(
+        "ffmpeg", "-hide_banner", "-loglevel", "error",
+        "-f", source_format, "-i", "pipe:0",
+        *FFMPEG_OUTPUT_ARGS[target_format], "pipe:1",
+        stdin=asyncio.subprocess.PIPE,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE
+    )
+    stdout, stderr = await process.communicate(data)
+
+    if process.returncode != 0:
+        raise RuntimeError(f"ffmpeg failed to convert {source_format} to {target_format}: {stderr.decode(errors='ignore').strip()}")
+
+    return stdout
+
+async def duration(data: bytes, audio_format: str) -> Optional[float]:
+    '''
+    length of the audio in seconds, None when it can not be read
+    '''
+    if audio_format == WAV:
+        with wave.open(io.BytesIO(data), "rb") as source:
+            return round(source.getnframes() / source.getframerate(), 3)
+
+    try:
+        process = await asyncio.create_subprocess_exec(
+            "ffprobe", "-v", "error",
+            "-show_entries", "format=duration", "-of", "csv=p=0",
+            "-i", "pipe:0",
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL
+        )
+        stdout, _ = await process.communicate(data)
+        return round(float(stdout.decode().strip()), 3)
+    except (OSError, ValueError) as e:
+        logger.warning(f"audio duration probe failed: {e}")
+        return None
@@ -0,0 +1,26 @@
+import asyncio
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# keep a strong reference to every running task, otherwise the event loop
+# may garbage collect a task that nobody awaits before it is finished
+_running_tasks = set()
+
+def run_in_background(coroutine) -> asyncio.Task:
+    task = asyncio.create_task(coroutine)
+    _running_tasks.add(task)
+    task.add_done_callback(_running_tasks.discard)
+    return task
+
+async def run_periodically(job, interval: float):
+    '''
+    awaits job() every interval seconds until cancelled, a failing run
+    never stops the next one
+    '''
+    while True:
+        try:
+            await job()
+        except Exception:
+            logger.exception(f"periodic job {job.__name__} failed")
+        await asyncio.sleep(interval)
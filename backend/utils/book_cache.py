@@ -0,0 +1,51 @@
+from itertools import count
+from typing import Optional
+from cachetools import TTLCache
+from setting.settings import settings
+
+'''
+serialized bodies of GET /api/v1/book/{id}, keyed by book id and tagged with the
+version of the book they were built from. every write to a book bumps its version
+and drops its entry here, so a repeat open skips both mongo and the json encoding.
+writes made by another backend instance can not reach this cache, the TTL bounds
+how long such an entry is served.
+'''
+
+_cache = TTLCache(maxsize=settings.BOOK_CACHE_SIZE, ttl=settings.BOOK_CACHE_TTL)
+# write sequence number per book, lets put() notice a write that happened during its read
+_written_at = TTLCache(maxsize=settings.BOOK_CACHE_SIZE, ttl=settings.BOOK_CACHE_TTL)
+_sequence = count(1)
+_last_sequence = 0
+_stats = {"hits": 0, "misses": 0, "invalidations": 0}
+
+def etag(book_id: str, version: int) -> str:
+    return f'"{book_id}-{version}"'
+
+def read_token() -> int:
+    # taken before reading a book from mongo, handed to put() with the result
+    return _last_sequence
+
+def get(book_id: str) -> Optional[dict]:
+    '''
+    returns {"user_id", "version", "etag", "body"} or None on a miss
+    '''
+    entry = _cache.get(book_id)
+    _stats["hits" if entry else "misses"] += 1
+    return entry
+
+def put(book_id: str, user_id: str, version: int, body: bytes, token: int) -> dict:
+    entry = {"user_id": user_id, "version": version, "etag": etag(book_id, version), "body": body}
+    # a write that landed after the read started makes this body stale, serve it once but never cache it
+    if _written_at.get(book_id, 0) <= token:
+        _cache[book_id] = entry
+    return entry
+
+def invalidate(book_id: str):
+    global _last_sequence
+    _last_sequence = next(_sequence)
+    _written_at[book_id] = _last_sequence
+    _cache.pop(book_id, None)
+    _stats["invalidations"] += 1
+
+def stats() -> dict:
+    return {**_stats, "size": len(_cache)}
@@ -1,24 +1,59 @@
 from utils.ai import generate_image
 from utils.ai import synthesize_speech
+from utils.ai import synthesize_speech_batch
+from utils.ai import resilient
+from utils.ai import notify
+from setting.settings import settings
+from utils.scheduler import COVER_PRIORITY
 import asyncio
 
 '''
 this function used to execute multiple async process simultaneously
 to shorten the duration can trim the request lenght ex: commented code below
+
+every request is tagged with a priority for the media scheduler: the cover first,
+then the scenes in reading order, the scheduler bounds how many of them run at once
+
+on_complete (optional) is awaited with every single result as soon as it is ready,
+so the caller can persist progress before the whole batch is done
+
+with TTS_BATCH_MODE the narration of every scene is read in as few provider requests as possible
+
+every item is retried with backoff, an item that still fails comes back as a result with
+an "error" instead of failing the whole batch
 '''
-async def generate_multiple_image_and_voice_concurrently(requests):
+async def generate_multiple_image_and_voice_concurrently(requests, on_complete=None):
     tasks = []
+    voice_requests = []
 
     # uncomment the code line below to save cloud credit for image and voice generation
     # requests = requests[:4]
 
+    reading_order = {}
+    for request in requests:
+        scene_id = request.get("scene_id")
+        if scene_id is not None and scene_id not in reading_order:
+            reading_order[scene_id] = len(reading_order) + 1
+
     for request in requests:
         request_type = request.get("type")
 
+        if request_type == "cover_image":
+            request.setdefault("priority", COVER_PRIORITY)
+        else:
+            request.setdefault("priority", reading_order.get(request.get("scene_id"), len(reading_order) + 1))
+
         if request_type == "image" or request_type == "cover_image":
-            tasks.append(generate_image(request))
+            tasks.append(notify(resilient(generate_image, request), on_complete))
 
         if request_type == "voice":
-            tasks.append(synthesize_speech(request))
+            if settings.TTS_BATCH_MODE:
+                voice_requests.append(request)
+            else:
+                tasks.append(notify(resilient(synthesize_speech, request), on_complete))
+
+    if not voice_requests:
+        return await asyncio.gather(*tasks)
 
-    return await asyncio.gather(*tasks)
+    *results, voice_results = await asyncio.gather(*tasks, synthesize_speech_batch(voice_requests, on_complete))
+    return results + voice_results
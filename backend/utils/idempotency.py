@@ -0,0 +1,123 @@
+import asyncio
+import hashlib
+import json
+from datetime import datetime, timedelta
+from beanie import UpdateResponse
+from fastapi import HTTPException
+from pymongo.errors import DuplicateKeyError
+from models.idempotency_record import IdempotencyRecord, IdempotencyStatus
+from utils.background import run_in_background
+from setting.settings import settings
+
+'''
+runs a request at most once per Idempotency-Key: the first request stores a record and
+does the work, a retry while it is running waits for the same result, a retry after it
+is done gets the stored response. a key sent again with another request is rejected.
+a running job renews the lease of its record, a record whose lease ran out belongs to
+an instance that stopped and the next retry takes it over.
+'''
+
+POLL_INTERVAL = 1  # sec
+
+# jobs running in this process, a retry that lands here attaches to them directly
+_in_flight = {}
+
+def fingerprint(**parts) -> str:
+    payload = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+async def run_once(user_id: str, key: str, request_fingerprint: str, job) -> dict:
+    '''
+    job: function returning the coroutine that does the work, its result must be json serializable
+    '''
+    record = IdempotencyRecord(user_id=user_id, key=key, fingerprint=request_fingerprint, lease_until=_lease())
+    try:
+        await record.insert()
+    except DuplicateKeyError:
+        return await _attach(user_id, key, request_fingerprint, job)
+
+    return await _start(record, job)
+
+def _lease() -> datetime:
+    return datetime.utcnow() + timedelta(seconds=settings.IDEMPOTENCY_LEASE)
+
+async def _start(record: IdempotencyRecord, job) -> dict:
+    user_id, key = record.user_id, record.key
+    task = run_in_background(_run(record, job))
+    _in_flight[(user_id, key)] = task
+    task.add_done_callback(lambda _: _in_flight.pop((user_id, key), None))
+
+    # the job keeps running when the client gives up, its retry picks up the result
+    return await asyncio.shield(task)
+
+async def _run(record: IdempotencyRecord, job) -> dict:
+    heartbeat = run_in_background(_renew_lease(record))
+    try:
+        response = await job()
+    except BaseException:
+        # nothing was stored for the client, let the next retry start over
+        await record.delete()
+        raise
+    finally:
+        heartbeat.cancel()
+
+    await IdempotencyRecord.find_one(IdempotencyRecord.id == record.id).update(
+        {"$set": {"status": IdempotencyStatus.completed, "response": response}}
+    )
+    return response
+
+async def _renew_lease(record: IdempotencyRecord):
+    while True:
+        await asyncio.sleep(settings.IDEMPOTENCY_LEASE / 3)
+        await IdempotencyRecord.find_one(
+            IdempotencyRecord.id == record.id,
+            IdempotencyRecord.status == IdempotencyStatus.in_progress
+        ).update({"$set": {"lease_until": _lease()}})
+
+async def _take_over(record: IdempotencyRecord) -> bool:
+    # records written before the lease existed have none, they count as expired
+    result = await IdempotencyRecord.find_one(
+        {
+            "_id": record.id,
+            "status": IdempotencyStatus.in_progress,
+            "lease_until": {"$not": {"$gte": datetime.utcnow()}}
+        }
+    ).update({"$set": {"lease_until": _lease()}}, response_type=UpdateResponse.UPDATE_RESULT)
+    # only one retry matches, the others keep waiting for it
+    return result.matched_count == 1
+
+async def _attach(user_id: str, key: str, request_fingerprint: str, job) -> dict:
+    task = _in_flight.get((user_id, key))
+    if task:
+        record = await _find(user_id, key)
+        _check_fingerprint(record, request_fingerprint)
+        return await asyncio.shield(task)
+
+    # the job runs in another instance, wait for its record to complete
+    waited = 0
+    while waited < settings.IDEMPOTENCY_WAIT_TIMEOUT:
+        record = await _find(user_id, key)
+        if not record:
+            raise HTTPException(status_code=409, detail="the request with this Idempotency-Key failed, please retry")
+
+        _check_fingerprint(record, request_fingerprint)
+        if record.status == IdempotencyStatus.completed:
+            return record.response
+
+        if await _take_over(record):
+            return await _start(record, job)
+
+        await asyncio.sleep(POLL_INTERVAL)
+        waited += POLL_INTERVAL
+
+    raise HTTPException(status_code=409, detail="the request with this Idempotency-Key is still in progress")
+
+async def _find(user_id: str, key: str):
+    return await IdempotencyRecord.find_one(
+        IdempotencyRecord.user_id == user_id,
+        IdempotencyRecord.key == key
+    )
+
+def _check_fingerprint(record: IdempotencyRecord, request_fingerprint: str):
+    if record and record.fingerprint != request_fingerprint:
+        raise HTTPException(status_code=422, detail="Idempotency-Key was already used for another request")
@@ -0,0 +1,72 @@
+import asyncio
+import io
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from PIL import Image
+from setting.settings import settings
+
+'''
+re-encodes the generated images before the upload: a full size webp for the reader
+and a small thumbnail for the book cards. encoding is cpu bound, so it runs on a
+process pool and never blocks the event loop or the threadpool.
+'''
+
+IMAGE_FORMAT = "webp"
+
+# everything that changes the encoded bytes, part of the media cache key
+ENCODING_PARAMS = {
+    "format": IMAGE_FORMAT,
+    "quality": settings.IMAGE_WEBP_QUALITY,
+    "thumbnail_width": settings.IMAGE_THUMBNAIL_WIDTH,
+}
+
+_encode_executor = None
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _encode_executor
+    if _encode_executor is None:
+        # spawn, not fork: by now the grpc channels, the azure sdk and the log listener run
+        # threads, and a forked child inherits their locks in whatever state they were
+        _encode_executor = ProcessPoolExecutor(
+            max_workers=settings.IMAGE_ENCODE_WORKERS,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return _encode_executor
+
+def _encode(image: Image.Image, quality: int) -> bytes:
+    buffer = io.BytesIO()
+    image.save(buffer, format=IMAGE_FORMAT, quality=quality, method=4)
+    return buffer.getvalue()
+
+def _encode_variants(data: bytes, quality: int, thumbnail_width: int) -> tuple:
+    # runs in a worker process, only bytes cross the process boundary
+    with Image.open(io.BytesIO(data)) as source:
+        image = source.convert("RGBA" if source.mode in ("RGBA", "LA", "P") else "RGB")
+
+    full = _encode(image, quality)
+
+    thumbnail_height = round(image.height * thumbnail_width / image.width)
+    image.thumbnail((thumbnail_width, thumbnail_height), Image.Resampling.LANCZOS)
+    thumbnail = _encode(image, quality)
+
+    return full, thumbnail
+
+async def encode_variants(data: bytes) -> dict:
+    '''
+    returns {"full": bytes, "thumbnail": bytes}, both webp
+    '''
+    loop = asyncio.get_running_loop()
+    full, thumbnail = await loop.run_in_executor(
+        _get_executor(),
+        _encode_variants,
+        data,
+        settings.IMAGE_WEBP_QUALITY,
+        settings.IMAGE_THUMBNAIL_WIDTH
+    )
+    return {"full": full, "thumbnail": thumbnail}
+
+def shutdown():
+    global _encode_executor
+    if _encode_executor is not None:
+        _encode_executor.shutdown(wait=False, cancel_futures=True)
+        _encode_executor = None
@@ -0,0 +1,67 @@
+from pymongo.errors import OperationFailure
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+'''
+creates the indexes the models declare, compares them with the ones mongo has, and
+lists the indexes no query used since the mongo server started. init_beanie runs with
+skip_indexes: it builds all indexes of a model in one call, and one failed build (e.g.
+the unique email index over existing duplicate emails) would abort the startup. here
+every index is built on its own, a failed one is logged and reported as failed.
+indexes a model stopped declaring are never dropped, they are reported as undeclared.
+'''
+
+_last_report = {}
+_failed = {}
+
+async def create_indexes(models: list):
+    for model in models:
+        collection = model.get_motor_collection()
+        _failed[collection.name] = []
+        for index in getattr(model.Settings, "indexes", []):
+            try:
+                await collection.create_indexes([index])
+            except OperationFailure as e:
+                _failed[collection.name].append(index.document["name"])
+                logger.error(
+                    "index build failed",
+                    extra={"fields": {"collection": collection.name, "index": index.document["name"], "error": str(e)}}
+                )
+
+async def report_indexes(models: list) -> dict:
+    for model in models:
+        collection = model.get_motor_collection()
+        try:
+            _last_report[collection.name] = await _report_collection(model, collection)
+        except Exception as e:
+            # $indexStats needs the clusterMonitor role on some deployments, never fail the startup on it
+            logger.warning(f"index report of {collection.name} failed: {e}")
+            continue
+
+        collection_report = _last_report[collection.name]
+        if collection_report["failed"] or collection_report["missing"] or collection_report["undeclared"]:
+            logger.warning("index mismatch", extra={"fields": {"collection": collection.name, **collection_report}})
+        else:
+            logger.info("indexes checked", extra={"fields": {"collection": collection.name, **collection_report}})
+
+    return _last_report
+
+async def _report_collection(model, collection) -> dict:
+    # pymongo names every IndexModel, from its keys unless the model gives a name
+    declared = {index.document["name"] for index in getattr(model.Settings, "indexes", [])}
+    existing = set((await collection.index_information()).keys()) - {"_id_"}
+    usage = {
+        stats["name"]: stats["accesses"]["ops"]
+        async for stats in collection.aggregate([{"$indexStats": {}}])
+    }
+
+    return {
+        "failed": _failed.get(collection.name, []),
+        "missing": sorted(declared - existing),
+        "undeclared": sorted(existing - declared),
+        "unused": sorted(name for name in existing if usage.get(name, 0) == 0),
+    }
+
+def stats() -> dict:
+    return _last_report
@@ -0,0 +1,33 @@
+from decimal import Decimal
+import orjson
+from bson import ObjectId
+from pydantic import BaseModel
+from fastapi.responses import JSONResponse
+
+'''
+orjson based JSON encoding for the responses. orjson writes datetime, date, enum,
+uuid and dataclasses natively; ObjectId, pydantic models (Beanie documents too) and
+sets go through _default. a handler that returns an ORJSONResponse itself also skips
+jsonable_encoder, which is most of the cost for a full book.
+'''
+
+OPTIONS = orjson.OPT_NON_STR_KEYS
+
+def _default(value):
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, BaseModel):
+        # by alias, the same field names jsonable_encoder gives
+        return value.model_dump(by_alias=True)
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def dumps(content) -> bytes:
+    return orjson.dumps(content, default=_default, option=OPTIONS)
+
+class ORJSONResponse(JSONResponse):
+    def render(self, content) -> bytes:
+        return dumps(content)
@@ -0,0 +1,87 @@
+import hashlib
+import json
+import re
+import unicodedata
+from collections import defaultdict
+from datetime import datetime
+from typing import Optional
+from cachetools import LRUCache
+from beanie import UpdateResponse
+from models.media_cache import MediaCache
+from setting.settings import settings
+from utils.logger import get_logger
+from utils.metrics import count
+
+logger = get_logger(__name__)
+
+'''
+content addressed cache for generated media, the key is a hash of everything that
+changes the provider output and the value is the url of the already uploaded blob
+together with its meta data.
+a small in-process LRU sits in front of the mongo index, mongo evicts by TTL.
+'''
+
+_memory_cache = LRUCache(maxsize=settings.MEDIA_CACHE_MEMORY_SIZE)
+_stats = defaultdict(lambda: {"hits": 0, "misses": 0, "errors": 0})
+
+def normalize_text(text: str) -> str:
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFC", text or "")).strip()
+
+def build_key(kind: str, **parts) -> str:
+    payload = json.dumps([kind, parts], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+async def get(kind: str, key: str) -> Optional[dict]:
+    '''
+    returns {"url": ..., **meta} or None on a miss
+    '''
+    value = _memory_cache.get(key)
+    if value:
+        _stats[kind]["hits"] += 1
+        count("cache_hit", kind)
+        return value
+
+    try:
+        # refresh the TTL in the same round trip as the lookup
+        entry = await MediaCache.find_one(MediaCache.key == key).update(
+            {"$set": {"last_used_at": datetime.utcnow()}, "$inc": {"hits": 1}},
+            response_type=UpdateResponse.NEW_DOCUMENT
+        )
+    except Exception as e:
+        # the cache must never fail the generation, treat it as a miss
+        logger.warning(f"media cache lookup failed: {e}")
+        _stats[kind]["errors"] += 1
+        entry = None
+
+    if not entry:
+        _stats[kind]["misses"] += 1
+        count("cache_miss", kind)
+        return None
+
+    value = {**entry.meta, "url": entry.url}
+    _memory_cache[key] = value
+    _stats[kind]["hits"] += 1
+    count("cache_hit", kind)
+    return value
+
+async def put(kind: str, key: str, url: str, **meta):
+    _memory_cache[key] = {**meta, "url": url}
+    now = datetime.utcnow()
+    try:
+        await MediaCache.find_one(MediaCache.key == key).upsert(
+            {"$set": {"url": url, "meta": meta, "last_used_at": now}},
+            on_insert=MediaCache(key=key, kind=kind, url=url, meta=meta, created_at=now, last_used_at=now)
+        )
+    except Exception as e:
+        logger.warning(f"media cache store failed: {e}")
+        _stats[kind]["errors"] += 1
+
+def stats() -> dict:
+    return {
+        kind: {
+            **counter,
+            "hit_rate": round(counter["hits"] / (counter["hits"] + counter["misses"]), 3)
+            if counter["hits"] + counter["misses"] else 0.0
+        }
+        for kind, counter in _stats.items()
+    }
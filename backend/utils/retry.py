@@ -0,0 +1,31 @@
+import asyncio
+import random
+from fastapi import HTTPException
+from setting.settings import settings
+from utils.metrics import count
+
+# client errors will fail the same way again, everything else may be transient
+RETRYABLE_STATUS_CODES = {408, 429}
+
+def is_retryable(error: Exception) -> bool:
+    if isinstance(error, HTTPException):
+        return error.status_code >= 500 or error.status_code in RETRYABLE_STATUS_CODES
+    return True
+
+async def retry_with_backoff(factory, attempts: int = None, base_delay: float = None):
+    '''
+    factory: function returning a new awaitable for every attempt,
+    waits base_delay * 2^attempt (with jitter) between the attempts
+    '''
+    attempts = attempts or settings.MEDIA_RETRY_ATTEMPTS
+    base_delay = settings.MEDIA_RETRY_BASE_DELAY if base_delay is None else base_delay
+
+    for attempt in range(attempts):
+        try:
+            return await factory()
+        except Exception as e:
+            if attempt == attempts - 1 or not is_retryable(e):
+                raise
+            count("retry", type(e).__name__)
+            delay = base_delay * (2 ** attempt)
+            await asyncio.sleep(delay + random.uniform(0, delay))
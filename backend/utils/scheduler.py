@@ -0,0 +1,110 @@
+import asyncio
+import heapq
+import itertools
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from setting.settings import settings
+
+'''
+process wide limiter for the media pipeline, every book shares the same slots so
+many books created at once can not flood the threadpool or the provider rate limits.
+waiting work is served by priority (lower first), then by arrival order.
+'''
+
+IMAGE = "image"
+VOICE = "voice"
+UPLOAD = "upload"
+
+COVER_PRIORITY = 0
+WAIT_TIME_SAMPLE_SIZE = 1000
+
+class _PriorityLimiter:
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.in_flight = 0
+        self.queued = 0
+        self.max_queued = 0
+        self.acquired = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self._waiters = []
+        self._counter = itertools.count()
+        self._recent_waits = deque(maxlen=WAIT_TIME_SAMPLE_SIZE)
+
+    async def acquire(self, priority: int):
+        enqueued_at = time.monotonic()
+
+        if self.in_flight < self.limit and self.queued == 0:
+            self.in_flight += 1
+        else:
+            future = asyncio.get_running_loop().create_future()
+            heapq.heappush(self._waiters, (priority, next(self._counter), future))
+            self.queued += 1
+            self.max_queued = max(self.max_queued, self.queued)
+            try:
+                await future
+            except asyncio.CancelledError:
+                if future.done() and not future.cancelled():
+                    # the slot was already handed over to us, pass it on
+                    self.release()
+                else:
+                    future.cancel()
+                    self.queued -= 1
+                raise
+            finally:
+                if future.done() and not future.cancelled():
+                    self.queued -= 1
+
+        self._record_wait(time.monotonic() - enqueued_at)
+
+    def release(self):
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                # hand the slot over without touching in_flight
+                future.set_result(None)
+                return
+        self.in_flight -= 1
+
+    def _record_wait(self, wait: float):
+        self.acquired += 1
+        self.total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
+        self._recent_waits.append(wait)
+
+    def stats(self) -> dict:
+        recent_waits = sorted(self._recent_waits)
+        p95_index = min(int(len(recent_waits) * 0.95), len(recent_waits) - 1)
+        return {
+            "limit": self.limit,
+            "in_flight": self.in_flight,
+            "queue_depth": self.queued,
+            "max_queue_depth": self.max_queued,
+            "acquired": self.acquired,
+            "wait_avg_ms": round(self.total_wait / self.acquired * 1000, 1) if self.acquired else 0.0,
+            "wait_p95_ms": round(recent_waits[p95_index] * 1000, 1) if recent_waits else 0.0,
+            "wait_max_ms": round(self.max_wait * 1000, 1),
+        }
+
+class MediaScheduler:
+    def __init__(self, limits: dict):
+        self._limiters = {kind: _PriorityLimiter(limit) for kind, limit in limits.items()}
+
+    @asynccontextmanager
+    async def slot(self, kind: str, priority: int = COVER_PRIORITY):
+        limiter = self._limiters[kind]
+        await limiter.acquire(priority)
+        try:
+            yield
+        finally:
+            limiter.release()
+
+    def stats(self) -> dict:
+        return {kind: limiter.stats() for kind, limiter in self._limiters.items()}
+
+media_scheduler = MediaScheduler({
+    IMAGE: settings.MEDIA_IMAGE_CONCURRENCY,
+    VOICE: settings.MEDIA_VOICE_CONCURRENCY,
+    UPLOAD: settings.MEDIA_UPLOAD_CONCURRENCY,
+})
@@ -1,13 +1,85 @@
+import asyncio
+import io
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import BinaryIO, Optional, Union
 from setting.settings import settings
 from . import azure_storage
 from . import google_storage
 
 CLOUD_PLATFORM_OPTION = settings.CLOUD_PLATFORM_OPTION
 
-def upload_file(base64_string: str, folder_name: str, blob_filename: str) -> str:
+CONTENT_TYPES = {
+    ".webp": "image/webp",
+    ".png": "image/png",
+    ".wav": "audio/wav",
+    ".mp3": "audio/mpeg",
+    ".ogg": "audio/ogg",
+}
+
+# uploads get their own threads so they never wait behind image or voice generation
+# in the shared threadpool, the pool size matches the pooled http connections
+_upload_executor = ThreadPoolExecutor(
+    max_workers=settings.MEDIA_UPLOAD_CONCURRENCY,
+    thread_name_prefix="storage-upload"
+)
+
+UploadData = Union[bytes, bytearray, memoryview, BinaryIO]
+
+class _BufferReader(io.RawIOBase):
+    '''
+    seekable file-like view over a bytearray/memoryview, the storage SDKs read it
+    chunk by chunk without an extra copy of the whole buffer
+    '''
+    def __init__(self, buffer: Union[bytearray, memoryview]):
+        self._view = memoryview(buffer).cast("B")
+        self._position = 0
+        self.size = len(self._view)
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def readinto(self, target) -> int:
+        count = min(len(target), self.size - self._position)
+        target[:count] = self._view[self._position:self._position + count]
+        self._position += count
+        return count
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence == io.SEEK_END:
+            offset += self.size
+        self._position = max(0, min(offset, self.size))
+        return self._position
+
+    def tell(self) -> int:
+        return self._position
+
+def _as_upload_source(data: UploadData):
+    if isinstance(data, bytes):
+        return data, len(data)
+
+    if isinstance(data, (bytearray, memoryview)):
+        reader = _BufferReader(data)
+        return reader, reader.size
+
+    # already a stream, its size is unknown so it is uploaded in chunks
+    return data, None
+
+def upload_file(data: UploadData, folder_name: str, blob_filename: str, content_type: Optional[str] = None) -> str:
+    source, length = _as_upload_source(data)
+    content_type = content_type or CONTENT_TYPES.get(os.path.splitext(blob_filename)[1].lower())
+
     if CLOUD_PLATFORM_OPTION == "google":
-        return google_storage.upload_file_to_google_cloud_storage(base64_string,folder_name,blob_filename)
+        return google_storage.upload_file_to_google_cloud_storage(source,folder_name,blob_filename,content_type,length)
 
     # default to use azure
-    return azure_storage.upload_file_azure_blob_storage(base64_string,folder_name,blob_filename)
-    
\ No newline at end of file
+    return azure_storage.upload_file_azure_blob_storage(source,folder_name,blob_filename,content_type,length)
+
+async def upload_file_async(data: UploadData, folder_name: str, blob_filename: str, content_type: Optional[str] = None) -> str:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_upload_executor, upload_file, data, folder_name, blob_filename, content_type)
@@ -1,18 +1,39 @@
-import base64
+import requests
+from functools import lru_cache
+from typing import Optional
+from requests.adapters import HTTPAdapter
+from azure.core.pipeline.transport import RequestsTransport
+from azure.storage.blob import ContainerClient, ContentSettings
 from setting.settings import settings
-from azure.storage.blob import BlobClient
 
 STORAGE_ACCOUNT_NAME = "bihackathon"
 CONTAINER_NAME = "storage"
 SAS_TOKEN = settings.MICROSOFT_AZURE_BLOB_SAS_TOKEN
+CONTAINER_URL = f"https://{STORAGE_ACCOUNT_NAME}.blob.core.windows.net/{CONTAINER_NAME}"
 
-def upload_file_azure_blob_storage(base64_string: str, folder_name: str, blob_filename: str) -> str:
+@lru_cache(maxsize=None)
+def _get_container_client() -> ContainerClient:
+    # one long lived client per process, its http session keeps the connections alive
+    session = requests.Session()
+    session.mount("https://", HTTPAdapter(pool_maxsize=settings.MEDIA_UPLOAD_CONCURRENCY))
+    return ContainerClient.from_container_url(
+        f"{CONTAINER_URL}?{SAS_TOKEN}",
+        transport=RequestsTransport(session=session, session_owner=False),
+        # anything bigger than one chunk is streamed as blocks instead of a single put
+        max_single_put_size=settings.STORAGE_UPLOAD_CHUNK_SIZE,
+        max_block_size=settings.STORAGE_UPLOAD_CHUNK_SIZE
+    )
+
+def upload_file_azure_blob_storage(data, folder_name: str, blob_filename: str, content_type: Optional[str] = None, length: Optional[int] = None) -> str:
     blob_path = f"{folder_name}/{blob_filename}"
-    blob_url = f"https://{STORAGE_ACCOUNT_NAME}.blob.core.windows.net/{CONTAINER_NAME}/{blob_path}?{SAS_TOKEN}"
 
-    blob_client = BlobClient.from_blob_url(blob_url)
-    file_bytes = base64.b64decode(base64_string)
-    blob_client.upload_blob(file_bytes, overwrite=True)
+    _get_container_client().upload_blob(
+        blob_path,
+        data,
+        length=length,
+        overwrite=True,
+        content_settings=ContentSettings(content_type=content_type) if content_type else None
+    )
 
-    uploaded_url = f"https://{STORAGE_ACCOUNT_NAME}.blob.core.windows.net/{CONTAINER_NAME}/{blob_path}"
+    uploaded_url = f"{CONTAINER_URL}/{blob_path}"
     return uploaded_url
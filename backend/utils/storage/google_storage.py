@@ -1,8 +1,11 @@
 import os
+from functools import lru_cache
+from google.auth.transport.requests import AuthorizedSession
 from google.cloud import storage
 from google.oauth2 import service_account
+from requests.adapters import HTTPAdapter
 from setting.settings import settings
-import base64
+from typing import Optional
 
 BUCKET_NAME = "pan-sea-kanca"
 FILE_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -13,17 +16,33 @@ CREDENTIALS_FILE_PATH = os.path.join(
     KEYS_PATH, settings.BUCKET_STORAGE_SERVICE_ACCOUNT_JSON_NAME
 )
 
-def upload_file_to_google_cloud_storage(base64_string: str, folder_name: str, blob_filename: str) -> str:
+@lru_cache(maxsize=None)
+def _get_bucket() -> storage.Bucket:
+    # credentials and client are loaded once per process and share one pooled session
     try:
         gcs_credentials = service_account.Credentials.from_service_account_file(CREDENTIALS_FILE_PATH)
     except FileNotFoundError:
         raise FileNotFoundError(f"Service account key file not found at: {CREDENTIALS_FILE_PATH}")
 
-    storage_client = storage.Client(credentials=gcs_credentials)
-    bucket = storage_client.bucket(BUCKET_NAME)
+    session = AuthorizedSession(gcs_credentials)
+    session.mount("https://", HTTPAdapter(pool_maxsize=settings.MEDIA_UPLOAD_CONCURRENCY))
+
+    storage_client = storage.Client(
+        project=gcs_credentials.project_id,
+        credentials=gcs_credentials,
+        _http=session
+    )
+    return storage_client.bucket(BUCKET_NAME)
+
+def upload_file_to_google_cloud_storage(data, folder_name: str, blob_filename: str, content_type: Optional[str] = None, length: Optional[int] = None) -> str:
     blob_path = f"{folder_name}/{blob_filename}"
-    blob = bucket.blob(blob_path)
-    file_bytes = base64.b64decode(base64_string)
-    blob.upload_from_string(file_bytes)
+
+    if isinstance(data, bytes):
+        _get_bucket().blob(blob_path).upload_from_string(data, content_type=content_type)
+    else:
+        # a stream of unknown size goes through a chunked resumable upload
+        chunk_size = settings.STORAGE_UPLOAD_CHUNK_SIZE if length is None else None
+        blob = _get_bucket().blob(blob_path, chunk_size=chunk_size)
+        blob.upload_from_file(data, size=length, content_type=content_type)
     
     return f"https://storage.googleapis.com/{BUCKET_NAME}/{blob_path}"
\ No newline at end of file
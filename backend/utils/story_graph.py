@@ -0,0 +1,60 @@
+'''
+walks the scene graph of a story: narrative scenes point to one scene with next_scene,
+decision points point to one scene per choice in branch, endings point nowhere
+'''
+
+DECISION_POINT = "decision_point"
+
+def next_scene_ids(scene: dict) -> list:
+    if scene.get("branch"):
+        return [choice.get("next_scene") for choice in scene.get("branch") if choice.get("next_scene") is not None]
+
+    if scene.get("next_scene") is not None:
+        return [scene.get("next_scene")]
+
+    return []
+
+def first_scene_id(scenes: list):
+    return scenes[0].get("scene_id") if scenes else None
+
+def scenes_until_decision(scenes: list, start_scene_id=None) -> list:
+    '''
+    scene ids the reader goes through for sure, from start_scene_id (the first scene
+    by default) up to and including the next decision point
+    '''
+    scene_by_id = {scene.get("scene_id"): scene for scene in scenes}
+    scene_id = start_scene_id if start_scene_id is not None else first_scene_id(scenes)
+
+    scene_ids = []
+    while scene_id in scene_by_id and scene_id not in scene_ids:
+        scene = scene_by_id[scene_id]
+        scene_ids.append(scene_id)
+
+        following = next_scene_ids(scene)
+        if scene.get("type") == DECISION_POINT or len(following) != 1:
+            break
+        scene_id = following[0]
+
+    return scene_ids
+
+def scenes_within(scenes: list, start_scene_id, depth: int) -> list:
+    '''
+    scene ids reachable from start_scene_id in at most depth steps, nearest first,
+    every branch of a decision point is followed
+    '''
+    scene_by_id = {scene.get("scene_id"): scene for scene in scenes}
+    if start_scene_id not in scene_by_id:
+        return []
+
+    scene_ids = [start_scene_id]
+    frontier = [start_scene_id]
+    for _ in range(depth):
+        next_frontier = []
+        for scene_id in frontier:
+            for next_id in next_scene_ids(scene_by_id[scene_id]):
+                if next_id in scene_by_id and next_id not in scene_ids:
+                    scene_ids.append(next_id)
+                    next_frontier.append(next_id)
+        frontier = next_frontier
+
+    return scene_ids
@@ -0,0 +1,40 @@
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+'''
+the TTL of the expiring collections comes from the settings. mongo refuses to create an
+index that exists under the same name with other options, so the build of a changed
+TTL would fail. this runs before the indexes are built and moves the existing index to
+the configured TTL with collMod, then the build finds it as declared.
+'''
+
+async def sync_ttl_indexes(database, models: list):
+    for model in models:
+        collection_name = model.Settings.name
+        declared = {
+            index.document["name"]: index.document["expireAfterSeconds"]
+            for index in getattr(model.Settings, "indexes", [])
+            if "expireAfterSeconds" in index.document
+        }
+        if not declared:
+            continue
+
+        if collection_name not in await database.list_collection_names(filter={"name": collection_name}):
+            continue
+        existing = await database[collection_name].index_information()
+
+        for name, expire_after_seconds in declared.items():
+            current = existing.get(name, {}).get("expireAfterSeconds")
+            if current is None or current == expire_after_seconds:
+                continue
+
+            await database.command(
+                "collMod",
+                collection_name,
+                index={"name": name, "expireAfterSeconds": expire_after_seconds}
+            )
+            logger.info(
+                "ttl index updated",
+                extra={"fields": {"collection": collection_name, "index": name, "from": current, "to": expire_after_seconds}}
+            )